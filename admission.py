@@ -0,0 +1,193 @@
+#admission.py
+#
+# Admission control in front of the classification pipeline. Work is counted in seconds of
+# audio, not requests: an upload's length comes from its WAV header, or is estimated from
+# its size (audio_decode.estimate_audio_seconds), and is corrected once it has been decoded.
+# Below ADMISSION_MAX_AUDIO_SECONDS in flight new work starts at once. Above it a request
+# waits up to ADMISSION_MAX_WAIT_SECONDS for room, with at most ADMISSION_MAX_WAITING
+# requests waiting at a time. Work that cannot be admitted is turned away with a
+# Retry-After estimated from how fast audio has been draining:
+#   429  too many requests are already waiting
+#   503  the request waited and the pipeline is still full
+# A request larger than the whole budget is admitted when nothing else is in flight, so a
+# long recording is slow rather than impossible.
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Global Variables
+ADMISSION_MAX_AUDIO_SECONDS = float(os.environ.get('ADMISSION_MAX_AUDIO_SECONDS', '600'))
+ADMISSION_MAX_WAITING = int(os.environ.get('ADMISSION_MAX_WAITING', '16'))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', '2'))
+DRAIN_WINDOW_SECONDS = 30.0
+RETRY_AFTER_DEFAULT = 5
+RETRY_AFTER_MAX = 120
+ASYNC_POLL_SECONDS = 0.05
+
+
+class Overloaded(RuntimeError):
+    """Work turned away by the admission controller; status is 429 or 503, retry_after is in seconds."""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Admitted audio seconds; release() (or leaving the with block) hands them back."""
+
+    def __init__(self, controller, seconds):
+        self.controller = controller
+        self.seconds = seconds
+        self.released = False
+
+    def correct(self, estimated, actual):
+        """Replace an estimate with the decoded length once it is known."""
+        self.controller._adjust(self, actual - estimated)
+
+    def release(self):
+        self.controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """Bounds the seconds of audio in the pipeline; excess work waits briefly, then gets 429/503 with Retry-After."""
+
+    def __init__(self, max_audio_seconds=ADMISSION_MAX_AUDIO_SECONDS, max_waiting=ADMISSION_MAX_WAITING,
+                 max_wait_seconds=ADMISSION_MAX_WAIT_SECONDS):
+        self.max_audio_seconds = max_audio_seconds
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0.0
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.deferred = 0
+        self.rejected = {429: 0, 503: 0}
+        self._drained = deque()  # (release time, audio seconds) over the last DRAIN_WINDOW_SECONDS
+        self._condition = threading.Condition()
+
+    def _fits(self, seconds):
+        # Requests answered entirely from the cache bring no work, so they never wait
+        return seconds <= 0 or self.active == 0 or self.in_flight + seconds <= self.max_audio_seconds
+
+    def _grant(self, seconds):
+        self.in_flight += seconds
+        self.active += 1
+        self.admitted += 1
+        return Ticket(self, seconds)
+
+    def _queue(self, seconds):
+        # Called with the lock held: a ticket if there is room now, None after joining the wait line
+        if self._fits(seconds):
+            return self._grant(seconds)
+        if self.waiting >= self.max_waiting:
+            self.rejected[429] += 1
+            raise Overloaded(f"Too many requests waiting ({self.waiting}); try again later", 429, self._retry_after(seconds))
+        self.waiting += 1
+        self.deferred += 1
+        return None
+
+    def _reject(self, seconds):
+        self.rejected[503] += 1
+        return Overloaded(f"Server is at capacity ({self.in_flight:.0f}s of audio in progress); try again later",
+                          503, self._retry_after(seconds))
+
+    def admit(self, seconds, timeout=None):
+        """Ticket for `seconds` of audio, waiting up to timeout (default max_wait_seconds) for room; raises Overloaded."""
+        timeout = self.max_wait_seconds if timeout is None else timeout
+        with self._condition:
+            ticket = self._queue(seconds)
+            if ticket is not None:
+                return ticket
+            try:
+                if self._condition.wait_for(lambda: self._fits(seconds), timeout):
+                    return self._grant(seconds)
+            finally:
+                self.waiting -= 1
+            raise self._reject(seconds)
+
+    async def admit_async(self, seconds, timeout=None):
+        """admit() for the event loop: waits by polling instead of blocking a thread."""
+        timeout = self.max_wait_seconds if timeout is None else timeout
+        with self._condition:
+            ticket = self._queue(seconds)
+        if ticket is not None:
+            return ticket
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(ASYNC_POLL_SECONDS)
+                with self._condition:
+                    if self._fits(seconds):
+                        return self._grant(seconds)
+            with self._condition:
+                raise self._reject(seconds)
+        finally:
+            with self._condition:
+                self.waiting -= 1
+
+    def acquire(self, seconds):
+        """Wait as long as it takes; for background work, which has no client to turn away."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(seconds))
+            return self._grant(seconds)
+
+    def _adjust(self, ticket, delta):
+        with self._condition:
+            if ticket.released:
+                return
+            ticket.seconds += delta
+            self.in_flight += delta
+            if delta < 0:
+                self._condition.notify_all()
+
+    def _release(self, ticket):
+        with self._condition:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.in_flight -= ticket.seconds
+            self.active -= 1
+            if self.active == 0:
+                self.in_flight = 0.0  # don't let float error accumulate
+            self._drained.append((time.monotonic(), ticket.seconds))
+            self._condition.notify_all()
+
+    def _drain_rate(self):
+        # Audio seconds finished per wall-clock second, over the recent window
+        cutoff = time.monotonic() - DRAIN_WINDOW_SECONDS
+        while self._drained and self._drained[0][0] < cutoff:
+            self._drained.popleft()
+        return sum(seconds for _, seconds in self._drained) / DRAIN_WINDOW_SECONDS
+
+    def _retry_after(self, seconds):
+        rate = self._drain_rate()
+        if rate <= 0:
+            return RETRY_AFTER_DEFAULT
+        excess = self.in_flight + seconds - self.max_audio_seconds
+        return int(min(max(math.ceil(excess / rate), 1), RETRY_AFTER_MAX))
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_audio_seconds": self.max_audio_seconds,
+                "audio_seconds_in_flight": self.in_flight,
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "admitted": self.admitted,
+                "deferred": self.deferred,
+                "rejected_429": self.rejected[429],
+                "rejected_503": self.rejected[503],
+                "drain_rate": self._drain_rate(),
+            }
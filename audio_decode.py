@@ -0,0 +1,184 @@
+#audio_decode.py
+#
+# Decodes uploaded audio straight from memory into mono float32 PCM in [-1, 1] at the
+# pipeline's target rate. WAV is parsed straight from the upload buffer: mono 32-bit float
+# at the target rate is used in place without a copy, while integer PCM is converted to
+# a new float32 array in a single pass. Either is downmixed and resampled from its actual
+# rate with soxr (skipped when it already matches). Other
+# formats are decoded in-process with PyAV when it is installed; otherwise they are
+# piped to ffmpeg through pydub, which downmixes and resamples while decoding, and only
+# containers that need seeking (MP4 family) are spooled to a uniquely named file on tmpfs.
+import io
+import os
+import struct
+import tempfile
+
+import numpy as np
+import soxr
+from pydub import AudioSegment
+
+try:
+    import av
+except ImportError:  # PyAV is optional; without it compressed audio is decoded by an ffmpeg subprocess via pydub
+    av = None
+
+# Global Variables
+SPOOL_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+SEEKABLE_CONTAINERS = ('.m4a', '.mp4', '.3gp')
+RESAMPLE_QUALITY = 'HQ'
+COMPRESSED_BYTES_PER_SECOND = 16000  # 128 kbit/s, for sizing compressed uploads before they are decoded
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _to_mono(samples, channels):
+    if channels > 1:
+        return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def resample(audio_data, orig_sr, target_sr):
+    # soxr's multi-stage polyphase filter is both faster and cleaner than a single scipy
+    # resample_poly stage at every rate we see (see benchmark_resample.py)
+    if target_sr is None or orig_sr == target_sr:
+        return audio_data
+    return soxr.resample(audio_data, orig_sr, target_sr, quality=RESAMPLE_QUALITY).astype(np.float32, copy=False)
+
+
+def decode_wav_bytes(data):
+    """Return (samples, sr) for 16/32-bit PCM (copied to float32) or 32-bit float WAV (a view of data), or None."""
+    view = memoryview(data)
+    if len(view) < 12 or view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', view, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            audio_format, channels, sr, _, _, bits = struct.unpack_from('<HHIIHH', view, body)
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                audio_format = struct.unpack_from('<H', view, body + 24)[0]
+            fmt = (audio_format, channels, sr, bits)
+        elif chunk_id == b'data' and fmt is not None:
+            audio_format, channels, sr, bits = fmt
+            # Streamed WAVs may carry a placeholder size; trust the buffer instead
+            size = min(chunk_size, len(view) - body)
+            if audio_format == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+                samples = np.frombuffer(data, dtype='<f4', count=size // 4, offset=body)
+            elif audio_format == WAVE_FORMAT_PCM and bits in (16, 32):
+                dtype = '<i2' if bits == 16 else '<i4'
+                raw = np.frombuffer(data, dtype=dtype, count=size // (bits // 8), offset=body)
+                samples = np.multiply(raw, np.float32(1.0 / (1 << (bits - 1))), dtype=np.float32)
+            else:
+                return None
+            samples = samples[:len(samples) - len(samples) % channels]
+            return _to_mono(samples, channels), sr
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def wav_duration(data):
+    """Seconds of audio in a WAV upload, from its header alone, or None if it has no usable fmt/data chunks."""
+    view = memoryview(data)
+    if not is_wav(data):
+        return None
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', view, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ' and chunk_size >= 12:
+            byte_rate = struct.unpack_from('<I', view, body + 8)[0]
+        elif chunk_id == b'data' and byte_rate:
+            return min(chunk_size, len(view) - body) / byte_rate
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def estimate_audio_seconds(data):
+    """Length of an upload before decoding: exact for WAV, from the byte count for everything else."""
+    seconds = wav_duration(data)
+    if seconds is None:
+        seconds = len(data) / COMPRESSED_BYTES_PER_SECOND
+    return seconds
+
+
+def segment_to_float32(audio):
+    sample_width = audio.sample_width
+    if sample_width in (2, 4):
+        raw = np.frombuffer(audio.raw_data, dtype='<i2' if sample_width == 2 else '<i4')
+        samples = np.multiply(raw, np.float32(1.0 / (1 << (8 * sample_width - 1))), dtype=np.float32)
+    else:
+        samples = np.array(audio.get_array_of_samples(), dtype=np.float32) / float(1 << (8 * sample_width - 1))
+    return _to_mono(samples, audio.channels)
+
+
+def _decode_with_av(data, target_sr=None):
+    # Decodes in-process through libav: no ffmpeg subprocess, and BytesIO is seekable so MP4 needs no spool
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.audio[0]
+        sr = target_sr or stream.codec_context.sample_rate
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=sr)
+        chunks = []
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray()[0])
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray()[0])
+    audio_data = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    return audio_data.astype(np.float32, copy=False), sr
+
+
+def decode_compressed(data, filename, target_sr=None):
+    """Decode a non-WAV upload (or a WAV layout decode_wav_bytes doesn't handle) to mono float32."""
+    if av is not None:
+        return _decode_with_av(data, target_sr)
+
+    # Let ffmpeg downmix and resample in the same pass as decoding
+    parameters = ['-ac', '1'] + (['-ar', str(target_sr)] if target_sr else [])
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in SEEKABLE_CONTAINERS:
+        # The MP4 index can sit at the end of the file, so ffmpeg needs a seekable input
+        with tempfile.NamedTemporaryFile(dir=SPOOL_DIR, suffix=extension) as spool:
+            spool.write(data)
+            spool.flush()
+            audio = AudioSegment.from_file(spool.name, parameters=parameters)
+    elif extension == '.wav':
+        # pydub reads WAV itself, without ffmpeg
+        audio = AudioSegment.from_file(io.BytesIO(data), format='wav')
+        audio_data = segment_to_float32(audio)
+        if target_sr is None:
+            return audio_data, audio.frame_rate
+        return resample(audio_data, audio.frame_rate, target_sr), target_sr
+    else:
+        audio = AudioSegment.from_file(io.BytesIO(data), format=extension.lstrip('.') or None, parameters=parameters)
+    return segment_to_float32(audio), audio.frame_rate
+
+
+def is_wav(data):
+    return data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def decode_upload(data, filename, target_sr=None):
+    """Decode the raw bytes of an upload into (mono float32 samples, sample rate) without a temp-file round trip.
+
+    With target_sr set, the samples come back at that rate; otherwise at the file's native rate.
+    """
+    decoded = decode_wav_bytes(data)
+    if decoded is not None:
+        audio_data, sr = decoded
+        if target_sr is None:
+            return audio_data, sr
+        return resample(audio_data, sr, target_sr), target_sr
+    return decode_compressed(data, filename, target_sr)
+
+
+def load_audio_file(file_path, target_sr=None):
+    with open(file_path, 'rb') as f:
+        return decode_upload(f.read(), file_path, target_sr=target_sr)
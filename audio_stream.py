@@ -0,0 +1,105 @@
+#audio_stream.py
+#
+# Block-wise decoding for recordings too long to hold in memory. stream_audio_blocks
+# yields mono float32 blocks at the target rate straight from the file: libsndfile reads
+# WAV/FLAC/OGG/MP3 in blocks and soxr resamples them as a stream; other formats go
+# through PyAV when it is installed, or an ffmpeg pipe otherwise. WindowRing turns those
+# blocks into the overlapping analysis windows the scorer needs while only ever holding
+# one window of samples, so peak memory is independent of the file length.
+import os
+import subprocess
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from audio_decode import RESAMPLE_QUALITY, av
+
+# Global Variables
+STREAM_BLOCK_SECONDS = float(os.environ.get('STREAM_BLOCK_SECONDS', '1'))
+
+
+def _soundfile_blocks(path, target_sr, block_seconds):
+    with sf.SoundFile(path) as f:
+        resampler = None
+        if f.samplerate != target_sr:
+            resampler = soxr.ResampleStream(f.samplerate, target_sr, 1, dtype='float32', quality=RESAMPLE_QUALITY)
+        for block in f.blocks(blocksize=max(1, int(block_seconds * f.samplerate)), dtype='float32', always_2d=True):
+            mono = block.mean(axis=1, dtype=np.float32)
+            yield resampler.resample_chunk(mono) if resampler else mono
+        if resampler:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def _av_blocks(path, target_sr):
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=target_sr)
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray()[0]
+        for resampled in resampler.resample(None):
+            yield resampled.to_ndarray()[0]
+
+
+def _ffmpeg_blocks(path, target_sr, block_seconds):
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-f', 'f32le', '-ac', '1', '-ar', str(target_sr), '-']
+    block_bytes = max(1, int(block_seconds * target_sr)) * 4
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 4], dtype='<f4')
+
+
+def stream_audio_blocks(path, target_sr, block_seconds=STREAM_BLOCK_SECONDS):
+    """Yield mono float32 blocks of a file at target_sr without decoding the whole file first."""
+    try:
+        sf.info(path)
+    except RuntimeError:  # not a format libsndfile reads (LibsndfileError is a RuntimeError)
+        if av is not None:
+            yield from _av_blocks(path, target_sr)
+        else:
+            yield from _ffmpeg_blocks(path, target_sr, block_seconds)
+        return
+    yield from _soundfile_blocks(path, target_sr, block_seconds)
+
+
+class WindowRing:
+    """Turns a stream of sample blocks into (start, end, window) windows of window_len samples every hop samples."""
+
+    def __init__(self, window_len, hop):
+        if not 0 < hop <= window_len:
+            raise ValueError(f"Window hop must be in (0, {window_len}], got {hop}")
+        self.window_len = window_len
+        self.hop = hop
+        self.buffer = np.zeros(window_len, dtype=np.float32)
+        self.filled = 0
+        self.start = 0
+        self.emitted = 0
+
+    def push(self, block):
+        offset = 0
+        while offset < len(block):
+            take = min(self.window_len - self.filled, len(block) - offset)
+            self.buffer[self.filled:self.filled + take] = block[offset:offset + take]
+            self.filled += take
+            offset += take
+            if self.filled == self.window_len:
+                yield self._emit(self.window_len)
+                # Keep the overlap for the next window
+                keep = self.window_len - self.hop
+                self.buffer[:keep] = self.buffer[self.hop:]
+                self.filled = keep
+                self.start += self.hop
+
+    def flush(self):
+        """Zero-padded final window, if the stream ended with samples no window has covered yet."""
+        if self.filled > self.window_len - self.hop or self.emitted == 0:
+            self.buffer[self.filled:] = 0
+            yield self._emit(self.filled)
+
+    def _emit(self, length):
+        self.emitted += 1
+        return self.start, self.start + length, self.buffer.copy()
@@ -0,0 +1,80 @@
+#benchmark_numpy_engine.py
+#
+# Compares the NumPy inference engine with Keras model.predict on the same saved model:
+#   keras   tensorflow.keras.models.load_model + model.predict(x, verbose=0)
+#   numpy   numpy_engine.NumpyModel + model.predict(x)
+# Each backend runs in its own process so the import/load time and peak RSS reflect what
+# a serving worker pays. Outputs from both are compared on the same seeded inputs.
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def run_backend(backend, model_path, batch_sizes, repeats):
+    start = time.perf_counter()
+    if backend == 'keras':
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model_path, compile=False)
+        predict = lambda x: model.predict(x, verbose=0)
+    else:
+        from numpy_engine import NumpyModel
+        model = NumpyModel(model_path)
+        predict = model.predict
+    load_seconds = time.perf_counter() - start
+
+    input_shape = tuple(model.input_shape[1:])
+    rng = np.random.default_rng(0)
+    timings, outputs = {}, []
+    for batch_size in batch_sizes:
+        x = rng.standard_normal((batch_size,) + input_shape).astype(np.float32)
+        outputs.extend(np.asarray(predict(x)).ravel().tolist())  # warm-up, also the accuracy sample
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predict(x)
+        timings[batch_size] = (time.perf_counter() - start) / repeats * 1000
+
+    return {
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "timings_ms": timings,
+        "outputs": outputs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the NumPy engine against Keras model.predict.')
+    parser.add_argument('--model', default='bestbigru.h5', help='Full-model .h5 or .keras file')
+    parser.add_argument('--batch-sizes', default='1,4,32', help='Comma-separated batch sizes')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed runs per batch size')
+    parser.add_argument('--backend', choices=('keras', 'numpy'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.model, batch_sizes, args.repeats)))
+        return
+
+    results = {}
+    for backend in ('keras', 'numpy'):
+        output = subprocess.run([sys.executable, __file__, '--backend', backend, '--model', args.model,
+                                 '--batch-sizes', args.batch_sizes, '--repeats', str(args.repeats)],
+                                check=True, capture_output=True, text=True).stdout
+        results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    keras_result, numpy_result = results['keras'], results['numpy']
+    diff = np.abs(np.array(keras_result['outputs']) - np.array(numpy_result['outputs']))
+    flips = int(np.sum((np.array(keras_result['outputs']) > 0.5) != (np.array(numpy_result['outputs']) > 0.5)))
+    print(f"{'backend':<8} {'load s':>8} {'peak RSS MB':>12} " + ' '.join(f"{'bs=' + str(b) + ' ms':>11}" for b in batch_sizes))
+    for backend, result in results.items():
+        print(f"{backend:<8} {result['load_seconds']:>8.2f} {result['peak_rss_mb']:>12.0f} "
+              + ' '.join(f"{result['timings_ms'][str(b)]:>11.2f}" for b in batch_sizes))
+    print(f"max |keras - numpy| = {diff.max():.2e} over {len(diff)} outputs, {flips} label flips")
+
+
+if __name__ == '__main__':
+    main()
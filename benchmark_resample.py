@@ -0,0 +1,76 @@
+#benchmark_resample.py
+#
+# Compares the decode + resample paths for uploads at common input rates:
+#   voice.py (old)   native decode, then librosa.resample(orig_sr=22050 -> 16000) whatever the real rate
+#   librosa.load     librosa.load(sr=16000) with its default high-quality resampler
+#   decode_upload    audio_decode.decode_upload(target_sr=16000), soxr from the actual input rate
+# Accuracy is the SNR against a very-high-quality soxr reference of the same clip.
+import argparse
+import io
+import time
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from audio_decode import decode_upload, decode_wav_bytes
+
+INPUT_RATES = (8000, 16000, 22050, 44100, 48000)
+
+
+def make_wav(sr, seconds):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(sr * seconds)) / sr
+    audio = 0.4 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 3100 * t) + 0.05 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    sf.write(buffer, audio.astype(np.float32), sr, subtype='PCM_16', format='WAV')
+    return buffer.getvalue()
+
+
+def old_voice_path(data, target_sr):
+    audio_data, _ = decode_wav_bytes(data)
+    return librosa.resample(audio_data, orig_sr=22050, target_sr=target_sr)
+
+
+def librosa_load_path(data, target_sr):
+    return librosa.load(io.BytesIO(data), sr=target_sr)[0]
+
+
+def decode_upload_path(data, target_sr):
+    return decode_upload(data, 'clip.wav', target_sr=target_sr)[0]
+
+
+def snr_db(reference, estimate):
+    if len(reference) != len(estimate):
+        return float('nan')
+    noise = np.sum((reference - estimate) ** 2)
+    return 10 * np.log10(np.sum(reference ** 2) / max(noise, 1e-20))
+
+
+def time_path(path, data, target_sr, repeats):
+    path(data, target_sr)  # warm-up (filter design, numba/soxr init)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = path(data, target_sr)
+    return (time.perf_counter() - start) / repeats * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark decode + resample paths.')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Clip length in seconds')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs per path')
+    parser.add_argument('--target-sr', type=int, default=16000, help='Pipeline sample rate')
+    args = parser.parse_args()
+
+    paths = [('voice.py (old)', old_voice_path), ('librosa.load', librosa_load_path), ('decode_upload', decode_upload_path)]
+    print(f"{'input sr':>8}  {'path':<16} {'ms/clip':>9} {'samples':>9} {'SNR dB':>8}")
+    for sr in INPUT_RATES:
+        data = make_wav(sr, args.seconds)
+        reference = librosa.resample(decode_wav_bytes(data)[0], orig_sr=sr, target_sr=args.target_sr, res_type='soxr_vhq')
+        for name, path in paths:
+            ms, result = time_path(path, data, args.target_sr, args.repeats)
+            print(f"{sr:>8}  {name:<16} {ms:>9.2f} {len(result):>9} {snr_db(reference, result):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#clip_broadcast.py
+#
+# The classifiers are trained on a per-clip feature vector repeated across one axis of
+# their input, and the serving code used to build that repeated tensor with np.repeat
+# before every predict. These wrappers take the compact vector instead and repeat it
+# inside the graph, in front of the unchanged trained model, so its weights load as-is:
+#   tile_over_channels   voice.py layout: the vector runs along the step axis and every
+#                        value is repeated across all channels, (steps,) -> (steps, channels).
+#                        steps is the length of the vector actually fed (167 for the default
+#                        feature_engine settings), which need not match the step axis the model
+#                        was built with: its Conv1D/GRU layers don't depend on it
+#   tile_over_frames     deployment layout: per-frame VGGish embeddings plus the clip vector
+#                        repeated on every frame, (frames, dims) + (clip_dims,) -> (frames, dims + clip_dims)
+# Runtimes without a graph to put the repeat in (numpy, tflite, onnx) get HostTiledModel,
+# which repeats one batch at a time inside predict, after InferenceQueue has stacked it;
+# TFLite and ONNX check the declared step axis, so export_runtime.py exports from with_steps.
+import numpy as np
+
+
+def with_steps(model, steps):
+    """`model` declared for `steps` input steps, running the same layers (and weights) as the original."""
+    import tensorflow as tf
+
+    model_steps, channels = model.input_shape[1:]
+    if model_steps in (None, steps):
+        return model
+    if not isinstance(model, tf.keras.Sequential):
+        raise ValueError(f"{model.name} takes {model_steps} steps but the clip vector has {steps}; rebuild it with an input of (None, {channels})")
+    # Keras checks the declared input shape, so rerun the (shared) layers on the new step count
+    inputs = tf.keras.layers.Input(shape=(steps, channels), name='features')
+    outputs = inputs
+    for layer in model.layers:
+        outputs = layer(outputs)
+    return tf.keras.Model(inputs, outputs, name=model.name)
+
+
+def tile_over_channels(model, steps):
+    """Keras model taking the (steps,) clip vector and repeating it across the channels of `model`."""
+    import tensorflow as tf
+
+    channels = model.input_shape[-1]
+    clip = tf.keras.layers.Input(shape=(steps,), name='clip_features')
+    repeated = tf.keras.layers.Permute((2, 1))(tf.keras.layers.RepeatVector(channels)(clip))  # (steps, channels)
+    return tf.keras.Model(clip, with_steps(model, steps)(repeated), name=f"{model.name}_tiled")
+
+
+def tile_over_frames(model, frame_dims):
+    """Keras model taking (frame features, clip vector) and repeating the clip vector on every frame."""
+    import tensorflow as tf
+
+    frames, dims = model.input_shape[1:]
+    frame_features = tf.keras.layers.Input(shape=(frames, frame_dims), name='frame_features')
+    clip = tf.keras.layers.Input(shape=(dims - frame_dims,), name='clip_features')
+    repeated = tf.keras.layers.RepeatVector(frames)(clip)
+    combined = tf.keras.layers.Concatenate(axis=-1)([frame_features, repeated])
+    return tf.keras.Model([frame_features, clip], model(combined), name=f"{model.name}_tiled")
+
+
+class HostTiledModel:
+    """tile_over_channels for runtimes that only take the full input; repeats per batch on the host."""
+
+    def __init__(self, model, steps):
+        self.model = model
+        self.steps = steps
+        self.channels = model.input_shape[-1]
+        self.input_shape = (None, steps)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[1:] != (self.steps,):
+            # Same contract as the tile_over_channels graph, whatever the runtime would accept
+            raise ValueError(f"Expected clip vectors of shape ({self.steps},), got {x.shape[1:]}")
+        return self.model.predict(np.repeat(x[:, :, np.newaxis], self.channels, axis=2), verbose=0)
@@ -31,15 +31,25 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 import joblib
 import time
+from feature_engine import compute_custom_features, feature_config_key
+from feature_pool import FeaturePool
+from feature_store import FeatureStore, file_content_hash
+from audio_decode import load_audio_file
+from vggish_bundle import LazyVGGish, VGGISH_MODEL_HANDLE
+
+# The DSP workers are fresh interpreters, so TensorFlow being imported above doesn't reach them
+feature_pool = FeaturePool()
 
 base_dir = '/content/drive/MyDrive/wav/PDFiles/Archive/KAGGLE/Retrain1'
 
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=True)
+# Loaded from the local bundle (VGGISH_BUNDLE_PATH) in the background while the audio is read
+vggish = LazyVGGish()
+vggish.warm_up_in_background()
 
 def process_audio_file(file_path, sr=16000):
     try:
-        audio, _ = librosa.load(file_path, sr=sr)
+        # Decodes to mono at sr in one pass (soxr resampling) instead of librosa.load's high-quality default
+        audio, _ = load_audio_file(file_path, target_sr=sr)
         if audio.ndim > 1:
             audio = np.mean(audio, axis=1)
         if np.max(audio) < 0.01:
@@ -54,62 +64,73 @@ def process_audio_file(file_path, sr=16000):
         return None, None
 
 def load_and_process_files(file_paths, sr=16000):
+    # Processed audio is cached on disk by file content, so reruns skip decoding and silence trimming
+    audio_store = FeatureStore('audio', f"sr={sr};resampler=soxr_hq;normalize=peak;split_top_db=20")
+
+    def load_cached(file_path):
+        content_hash = file_content_hash(file_path)
+        audio = audio_store.load(content_hash)
+        if audio is None:
+            audio, _ = process_audio_file(file_path, sr)
+            if audio is None:
+                return None, None, None
+            audio_store.save(content_hash, audio)
+        return audio, os.path.basename(os.path.dirname(file_path)), content_hash
+
     with ThreadPoolExecutor(max_workers=8) as executor:
-        results = list(tqdm(executor.map(lambda fp: process_audio_file(fp, sr), file_paths), total=len(file_paths)))
-    audios, labels = zip(*filter(lambda x: x[0] is not None, results))
-    return audios, labels
+        results = list(tqdm(executor.map(load_cached, file_paths), total=len(file_paths)))
+    audios, labels, content_hashes = zip(*filter(lambda x: x[0] is not None, results))
+    return audios, labels, content_hashes
 
 supported_extensions = ('.wav', '.mp3', '.m4a', '.aac')
 
 file_paths = [os.path.join(root, file) for root, _, files in os.walk(base_dir) for file in files if file.lower().endswith(supported_extensions)]
 
-audios, labels = load_and_process_files(file_paths)
+audios, labels, content_hashes = load_and_process_files(file_paths)
 
 print(f"Total audio files loaded: {len(audios)}")
 print(f"Total labels loaded: {len(labels)}")
 
 max_len = 22050 * 20  # 5 seconds at 16 kHz
-audios_padded = [np.pad(audio, (0, max_len - len(audio)), 'constant') if len(audio) < max_len else audio[:max_len] for audio in audios]
+
+class PaddedClips:
+    """Each clip padded or cut to max_len when it is read, rather than a padded copy of every clip up front."""
+
+    def __init__(self, audios, max_len):
+        self.audios = audios
+        self.max_len = max_len
+
+    def __len__(self):
+        return len(self.audios)
+
+    def __getitem__(self, i):
+        audio = self.audios[i]
+        return np.pad(audio, (0, self.max_len - len(audio)), 'constant') if len(audio) < self.max_len else audio[:self.max_len]
+
+audios_padded = PaddedClips(audios, max_len)
 
 le = LabelEncoder()
 labels_encoded = le.fit_transform(labels)
 print(f"Labels encoded. Classes: {le.classes_}")
 
 def extract_vggish_features(audio_data):
-    return vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
+    return vggish.embed([audio_data])[0]
 
 def extract_custom_features(audio_data):
-    mfcc_features = librosa.feature.mfcc(y=audio_data, sr=22050, n_mfcc=20)
-    mfcc_features = np.mean(mfcc_features.T, axis=0)  # Take the mean across time
-
-    chroma_features = librosa.feature.chroma_stft(y=audio_data, sr=22050)
-    chroma_features = np.mean(chroma_features.T, axis=0)
-
-    spectral_contrast = librosa.feature.spectral_contrast(y=audio_data, sr=22050)
-    spectral_contrast = np.mean(spectral_contrast.T, axis=0)
+    # Single STFT per clip; matches the separate librosa.feature calls within feature_engine.FEATURE_TOLERANCE
+    return compute_custom_features(audio_data, sr=22050)
 
-    mel_spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=22050)
-    mel_spectrogram = np.mean(mel_spectrogram.T, axis=0)
+# Feature stores are keyed by file content plus only the parameters each feature depends on
+vggish_store = FeatureStore('vggish', f"handle={VGGISH_MODEL_HANDLE};sr=16000;max_len={max_len}")
+custom_store = FeatureStore('custom', feature_config_key(22050, load_sr=16000, max_len=max_len))
 
-    # Concatenate all features ensuring they have the same dimension
-    combined_features = np.concatenate([
-        mfcc_features,
-        chroma_features,
-        spectral_contrast,
-        mel_spectrogram,
-    ])
-
-    return combined_features
-
-with ThreadPoolExecutor(max_workers=8) as executor:
-    vggish_features = list(tqdm(executor.map(extract_vggish_features, audios_padded), total=len(audios_padded)))
+vggish_features = vggish_store.map(content_hashes, audios_padded, vggish.embed)
 
 vggish_features = np.array(vggish_features)
 vggish_features = np.squeeze(vggish_features)
 print(f"VGGish feature extraction completed. Shape: {vggish_features.shape}")
 
-with ThreadPoolExecutor(max_workers=8) as executor:
-    custom_features = list(tqdm(executor.map(extract_custom_features, audios_padded), total=len(audios_padded)))
+custom_features = custom_store.map(content_hashes, audios_padded, lambda clips: feature_pool.map(clips, sr=22050))
 
 custom_features = np.array(custom_features)
 print(f"Custom feature extraction completed. Shape: {custom_features.shape}")
@@ -248,6 +269,9 @@ for i in range(3):overlay_chroma_features(audios[fake_indices[i]], f'FAKE Sample
 
 X_temp, X_test, y_temp, y_test = train_test_split(features, labels_encoded, test_size=0.1, random_state=42)
 X_train, X_val, y_train, y_val = train_test_split(X_temp, y_temp, test_size=0.2, random_state=42)
+# Held-out features for fuse_model.py --features and export_runtime.py --calibration / --labels
+np.save('X_test.npy', X_test)
+np.save('y_test.npy', y_test)
 print(f"Training set size: {len(X_train)}")
 print(f"Validation set size: {len(X_val)}")
 print(f"Test set size: {len(X_test)}")
@@ -741,14 +765,23 @@ import tensorflow_hub as hub
 from tensorflow.keras.models import load_model
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=False)
-model = load_model('/content/drive/MyDrive/wav/PDFiles/BestModels/FinalBiGru(Choice 1).h5')
+from feature_engine import compute_custom_features
+from audio_decode import load_audio_file
+from vggish_bundle import LazyVGGish
+from compiled_predict import CompiledPredictor
+from clip_broadcast import tile_over_frames
+from segment_scoring import SEGMENT_OVERLAP, score_file, stream_segments
+from audio_stream import stream_audio_blocks
+
+vggish = LazyVGGish()
+vggish.warm_up_in_background()
+# Takes (VGGish frames, custom vector) and repeats the custom vector across the frames in-graph;
+# traced per batch-size bucket and warmed up once, instead of model.predict per segment
+model = CompiledPredictor(tile_over_frames(load_model('/content/drive/MyDrive/wav/PDFiles/BestModels/FinalBiGru(Choice 1).h5'), frame_dims=128)).warm_up()
 
 def process_audio_file(file_path):
     try:
-        audio, _ = librosa.load(file_path, sr=16000)
+        audio, _ = load_audio_file(file_path, target_sr=16000)
         if audio.ndim > 1:
             audio = np.mean(audio, axis=1)
         if np.max(audio) < 0.01:
@@ -761,28 +794,10 @@ def process_audio_file(file_path):
         return None
 
 def extract_vggish_features(audio_data):
-    return vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
+    return vggish.embed([audio_data])[0]
 
 def extract_custom_features(audio_data):
-    mfcc_features = librosa.feature.mfcc(y=audio_data, sr=16000, n_mfcc=20)
-    mfcc_features = np.mean(mfcc_features.T, axis=0)
-    chroma_features = librosa.feature.chroma_stft(y=audio_data, sr=16000)
-    chroma_features = np.mean(chroma_features.T, axis=0)
-
-    spectral_contrast = librosa.feature.spectral_contrast(y=audio_data, sr=16000)
-    spectral_contrast = np.mean(spectral_contrast.T, axis=0)
-
-    mel_spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=16000)
-    mel_spectrogram = np.mean(mel_spectrogram.T, axis=0)
-
-    combined_features = np.concatenate([
-        mfcc_features,
-        chroma_features,
-        spectral_contrast,
-        mel_spectrogram,
-    ])
-
-    return combined_features
+    return compute_custom_features(audio_data, sr=16000)
 
 def pad_to_length(array, target_length, axis=0):
     current_length = array.shape[axis]
@@ -796,54 +811,31 @@ def pad_to_length(array, target_length, axis=0):
         array = array[tuple(slices)]
     return array
 
-def predict_audio(file_path):
-    audio = process_audio_file(file_path)
-    if audio is None:
-        return "Invalid audio file"
-
-    max_len = 16000 * 5
-    target_length = 7
-
-    segments = [audio[i * max_len:(i + 1) * max_len] for i in range(int(np.ceil(len(audio) / max_len)))]
-    segments = [np.pad(seg, (0, max_len - len(seg)), 'constant') if len(seg) < max_len else seg for seg in segments]
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        vggish_features = list(tqdm(executor.map(extract_vggish_features, segments), total=len(segments)))
-
-    vggish_features = np.array(vggish_features)
-    if len(vggish_features.shape) == 3 and vggish_features.shape[0] == 1:
-        vggish_features = np.squeeze(vggish_features, axis=0)
-    vggish_features = pad_to_length(vggish_features, target_length, axis=0)
-    print(f"VGGish feature extraction completed. Shape: {vggish_features.shape}")
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        custom_features = list(tqdm(executor.map(extract_custom_features, segments), total=len(segments)))
+def featurize_segments(segments, target_length=7):
+    # VGGish frames are padded or cut per segment; the custom vector is repeated across them in-graph
+    vggish_features = np.stack([pad_to_length(frames, target_length, axis=0) for frames in vggish.embed(list(segments))])
+    custom_features = np.array(feature_pool.map(list(segments), sr=16000))
+    return [vggish_features, custom_features]
 
-    custom_features = np.array(custom_features)
-    if len(custom_features.shape) == 3 and custom_features.shape[0] == 1:
-        custom_features = np.squeeze(custom_features, axis=0)
-    custom_features_expanded = np.repeat(custom_features[:, np.newaxis, :], target_length, axis=1)
-    custom_features_expanded = pad_to_length(custom_features_expanded, target_length, axis=1)
-    print(f"Custom feature extraction completed. Shape: {custom_features_expanded.shape}")
+def stream_audio(file_path, overlap=SEGMENT_OVERLAP, batch_segments=8):
+    """Yield each 5 s segment's features and score as the file is decoded, for recordings of any length."""
+    blocks = stream_audio_blocks(file_path, 16000)
+    yield from stream_segments(blocks, 16000, featurize_segments, model.predict, segment_seconds=5,
+                               overlap=overlap, batch_segments=batch_segments, with_features=True)
 
-    if len(vggish_features.shape) == 2:
-        vggish_features = np.expand_dims(vggish_features, axis=0)
-
-    if len(custom_features_expanded.shape) == 2:
-        custom_features_expanded = np.expand_dims(custom_features_expanded, axis=0)
-
-    features = np.concatenate([vggish_features, custom_features_expanded], axis=-1)
-    print(f"Combined feature extraction completed. Shape: {features.shape}")
-
-    predictions = []
-    for feature in features:
-        feature = np.expand_dims(feature, axis=0)
-        prediction = model.predict(feature)
-        predictions.append(prediction)
+def score_audio(file_path, overlap=SEGMENT_OVERLAP):
+    """Per-segment and aggregate scores for a recording of any length, decoded block by block."""
+    try:
+        return score_file(file_path, 16000, featurize_segments, model.predict, segment_seconds=5, overlap=overlap)
+    except Exception as e:
+        print(f"Error scoring file {file_path}: {e}")
+        return None
 
-    average_prediction = np.mean(predictions)
-    predicted_class = 'REAL' if average_prediction > 0.5 else 'FAKE'
-    return predicted_class
+def predict_audio(file_path):
+    result = score_audio(file_path)
+    if result is None or result["label"] is None:
+        return "Invalid audio file"
+    return result["label"]
 
 def predict_folder(folder_path):
     file_paths = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith('.wav')]
@@ -854,7 +846,7 @@ def predict_folder(folder_path):
 
     return predictions
 
-model.summary()
+model.model.summary()
 
 new_audio_file_path = '/content/drive/MyDrive/wav/PDFiles/Final-App/real-tested-audio/LJ001-0043.wav'
 predicted_class = predict_audio(new_audio_file_path)
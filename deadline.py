@@ -0,0 +1,60 @@
+#deadline.py
+#
+# Per-request deadlines. A Deadline starts when a request arrives (from the client's
+# X-Request-Timeout header, never beyond REQUEST_TIMEOUT_SECONDS) and travels with the
+# request's work through every stage: the decoder pool, the feature pool and the inference
+# queue drop queued work whose deadline has passed or whose request was cancelled, a decode
+# still running at the deadline is abandoned, and callers stop waiting at the deadline
+# instead of finishing work nobody will read.
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Global Variables
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', '60'))
+CANCEL_POLL_SECONDS = 0.1
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Absolute time.monotonic() expiry for one request, plus a cancel flag for clients that went away."""
+
+    def __init__(self, seconds=REQUEST_TIMEOUT_SECONDS):
+        self.expires_at = time.monotonic() + seconds
+        self.cancelled = False
+
+    @classmethod
+    def from_header(cls, value):
+        try:
+            seconds = min(float(value), REQUEST_TIMEOUT_SECONDS)
+        except (TypeError, ValueError):
+            seconds = REQUEST_TIMEOUT_SECONDS
+        return cls(max(seconds, 0.0))
+
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        return 0.0 if self.cancelled else max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(f"Request {'cancelled' if self.cancelled else 'deadline passed'}; gave up on {stage}")
+
+    def wait(self, future, stage):
+        """future.result(), giving up and cancelling the future once the deadline passes or the request is cancelled."""
+        while True:
+            try:
+                return future.result(timeout=min(self.remaining(), CANCEL_POLL_SECONDS))
+            except FutureTimeoutError:
+                if future.done():
+                    raise  # the work itself failed with a TimeoutError (or DeadlineExceeded)
+                if self.expired():
+                    future.cancel()
+                    self.check(stage)
@@ -0,0 +1,172 @@
+#decoder_pool.py
+#
+# Pool of long-lived decoder processes for compressed uploads (.mp3/.m4a/.aac/.3gp).
+# Each worker receives the upload bytes over a pipe and sends back raw float32 PCM,
+# so no ffmpeg process is started per file when PyAV is available. Jobs wait in a
+# bounded queue, shortest estimated audio first with aging (scheduling.py), so one long
+# upload does not hold up the short clips behind it; a worker that crashes or hangs is
+# replaced and only its current job fails. Jobs whose request deadline has passed (deadline.py) are dropped unstarted, and
+# a worker still decoding at the deadline is replaced the same way.
+# WAV uploads never enter the pool: they are decoded in the calling thread. Workers are
+# fresh interpreters (worker_process.py), never forks of the server.
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from itertools import count
+
+import numpy as np
+
+from audio_decode import av, decode_compressed, decode_upload, estimate_audio_seconds, is_wav
+from deadline import CANCEL_POLL_SECONDS, DeadlineExceeded
+from scheduling import WaitStats, sjf_key
+from worker_process import WorkerProcess
+
+# Global Variables
+DECODER_WORKERS = int(os.environ.get('DECODER_WORKERS', '2'))
+DECODER_QUEUE_SIZE = int(os.environ.get('DECODER_QUEUE_SIZE', '64'))
+DECODE_TIMEOUT = float(os.environ.get('DECODE_TIMEOUT', '60'))
+
+
+class DecoderPoolFull(RuntimeError):
+    pass
+
+
+def _decoder_worker(conn):
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        filename, target_sr = message
+        data = conn.recv_bytes()
+        try:
+            audio_data, sr = decode_compressed(data, filename, target_sr)
+            conn.send(('ok', sr))
+            conn.send_bytes(np.ascontiguousarray(audio_data, dtype=np.float32))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class DecoderPool:
+    """Bounded job queue in front of a fixed set of decoder processes, one dispatcher thread per process."""
+
+    def __init__(self, num_workers=DECODER_WORKERS, max_queue=DECODER_QUEUE_SIZE, decode_timeout=DECODE_TIMEOUT):
+        self.num_workers = num_workers
+        self.decode_timeout = decode_timeout
+        self.restarts = 0
+        self.dropped = 0
+        self.waits = WaitStats()
+        self._jobs = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = count()  # ties keep arrival order and never compare the job tuples
+        self._workers = [None] * num_workers
+        for index in range(num_workers):
+            self._start_worker(index)
+            threading.Thread(target=self._dispatch, args=(index,), name=f"decoder-dispatch-{index}", daemon=True).start()
+        print(f"[DecoderPool] : Started {num_workers} decoder workers")
+        if av is None:
+            print("[DecoderPool] : WARNING: PyAV is not installed, so every compressed upload starts ffprobe/ffmpeg "
+                  "subprocesses; pip install av to decode in the workers")
+
+    def _start_worker(self, index):
+        process = WorkerProcess(_decoder_worker)
+        self._workers[index] = (process, process.conn)
+
+    def _restart_worker(self, index):
+        process, conn = self._workers[index]
+        if process.is_alive():
+            process.kill()
+        process.join()
+        conn.close()
+        self.restarts += 1
+        self._start_worker(index)
+        print(f"[DecoderPool] : Restarted decoder worker {index} (exit code {process.exitcode})")
+
+    def submit(self, data, filename, target_sr=None, deadline=None):
+        future = Future()
+        audio_seconds = estimate_audio_seconds(data)
+        queued_at = time.monotonic()
+        try:
+            self._jobs.put_nowait((sjf_key(audio_seconds, queued_at), next(self._sequence),
+                                   (data, filename, target_sr, deadline, future, audio_seconds, queued_at)))
+        except queue.Full:
+            raise DecoderPoolFull(f"Decoder queue is full ({self._jobs.maxsize} jobs waiting)")
+        return future
+
+    def decode(self, data, filename, target_sr=None, deadline=None):
+        """Decode an upload to (mono float32 samples, sample rate); WAV is handled in the calling thread."""
+        if deadline is not None:
+            deadline.check(f"decoding {filename}")
+        if is_wav(data):
+            return decode_upload(data, filename, target_sr=target_sr)
+        future = self.submit(data, filename, target_sr, deadline)
+        return deadline.wait(future, f"decoding {filename}") if deadline is not None else future.result()
+
+    def _poll(self, conn, filename, deadline):
+        # Wait for the worker's reply, giving up at the decode timeout or the request's deadline
+        give_up = time.monotonic() + self.decode_timeout
+        while not conn.poll(CANCEL_POLL_SECONDS):
+            if deadline is not None:
+                deadline.check(f"decoding {filename}")
+            if time.monotonic() >= give_up:
+                raise TimeoutError(f"decoding {filename} took longer than {self.decode_timeout}s")
+
+    def _dispatch(self, index):
+        while True:
+            _, _, (data, filename, target_sr, deadline, future, audio_seconds, queued_at) = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.waits.record(audio_seconds, time.monotonic() - queued_at)
+            if deadline is not None and deadline.expired():
+                # Nobody is waiting for this one any more
+                self.dropped += 1
+                future.set_exception(DeadlineExceeded(f"Request deadline passed while {filename} was queued for decoding"))
+                continue
+
+            if not self._workers[index][0].is_alive():
+                self._restart_worker(index)
+            process, conn = self._workers[index]
+            try:
+                conn.send((filename, target_sr))
+                conn.send_bytes(data)
+                self._poll(conn, filename, deadline)
+                status, value = conn.recv()
+                if status == 'ok':
+                    future.set_result((np.frombuffer(conn.recv_bytes(), dtype=np.float32), value))
+                else:
+                    future.set_exception(RuntimeError(f"Failed to decode {filename}: {value}"))
+            except DeadlineExceeded as e:
+                # The request gave up mid-decode: stop the worker rather than let it finish for nobody
+                print(f"[DecoderPool] : Abandoning {filename} on decoder worker {index}: {e}")
+                self.dropped += 1
+                future.set_exception(e)
+                self._restart_worker(index)
+            except (EOFError, OSError, TimeoutError) as e:
+                # The worker died or hung mid-job: fail this job only and replace the worker
+                print(f"[DecoderPool] : Decoder worker {index} failed on {filename}: {e}")
+                traceback.print_exc()
+                future.set_exception(RuntimeError(f"Decoder worker failed on {filename}: {e}"))
+                self._restart_worker(index)
+
+    def stats(self):
+        return {
+            "workers": self.num_workers,
+            "alive": sum(1 for process, _ in self._workers if process.is_alive()),
+            "queued": self._jobs.qsize(),
+            "max_queue": self._jobs.maxsize,
+            "restarts": self.restarts,
+            "dropped": self.dropped,
+            "queue_wait": self.waits.summary(),
+        }
+
+    def shutdown(self):
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=1)
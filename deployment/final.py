@@ -1,53 +1,34 @@
 import os
+import sys
 import numpy as np
-import librosa
-import tensorflow as tf
-import tensorflow_hub as hub
 from tensorflow.keras.models import load_model
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=False)
-model = load_model('bestbigru.h5')
-
-def process_audio_file(file_path):
-    try:
-        audio, _ = librosa.load(file_path, sr=22050)
-        if audio.ndim > 1:
-            audio = np.mean(audio, axis=1)
-        if np.max(audio) < 0.01:
-            print(f"File {file_path} is silent or low volume, skipping.")
-            return None
-        audio = librosa.util.normalize(audio)
-        return audio
-    except Exception as e:
-        print(f"Error loading file {file_path}: {e}")
-        return None
-
-def extract_vggish_features(audio_data):
-    return vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
-
-def extract_custom_features(audio_data):
-    mfcc_features = librosa.feature.mfcc(y=audio_data, sr=22050, n_mfcc=20)
-    mfcc_features = np.mean(mfcc_features.T, axis=0)
-    chroma_features = librosa.feature.chroma_stft(y=audio_data, sr=22050)
-    chroma_features = np.mean(chroma_features.T, axis=0)
-
-    spectral_contrast = librosa.feature.spectral_contrast(y=audio_data, sr=22050)
-    spectral_contrast = np.mean(spectral_contrast.T, axis=0)
-
-    mel_spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=22050)
-    mel_spectrogram = np.mean(mel_spectrogram.T, axis=0)
-
-    combined_features = np.concatenate([
-        mfcc_features,
-        chroma_features,
-        spectral_contrast,
-        mel_spectrogram,
-    ])
-
-    return combined_features
+# The block decoder, segment scorer, compiled predictor, feature engine and VGGish loader are shared with
+# the server and the notebook, so segments are featurized exactly as in training
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_broadcast import tile_over_frames
+from compiled_predict import CompiledPredictor
+from feature_engine import compute_custom_features
+from segment_scoring import SEGMENT_OVERLAP, score_file
+from vggish_bundle import load_vggish_in_background
+
+vggish = load_vggish_in_background()
+trained_model = load_model('bestbigru.h5')
+
+# The custom feature vector is the same on every frame, so the model takes it once per segment
+# and repeats it inside the graph (clip_broadcast.py), traced once per batch-size bucket
+# (compiled_predict.py) instead of model.predict per segment
+VGGISH_DIMS = 128
+TARGET_FRAMES = trained_model.input_shape[1]
+model = CompiledPredictor(tile_over_frames(trained_model, frame_dims=VGGISH_DIMS)).warm_up()
+
+# Long recordings are scored as SEGMENT_SECONDS segments (sharing SEGMENT_OVERLAP of their length
+# with the next), SEGMENT_BATCH at a time, while the file is decoded block by block (segment_scoring.py,
+# audio_stream.py), so peak memory does not depend on the length of the recording
+SAMPLE_RATE = 22050
+SEGMENT_SECONDS = 20
+SEGMENT_BATCH = 32
 
 def pad_to_length(array, target_length, axis=0):
     current_length = array.shape[axis]
@@ -61,54 +42,27 @@ def pad_to_length(array, target_length, axis=0):
         array = array[tuple(slices)]
     return array
 
-def predict_audio(file_path):
-    audio = process_audio_file(file_path)
-    if audio is None:
-        return "Invalid audio file"
-
-    max_len = 22050 * 20
-    target_length = 28
+def featurize_segments(segments):
+    # VGGish frames are padded or cut per segment; the custom vector is repeated across them in-graph
+    vggish_features = np.stack([pad_to_length(frames, TARGET_FRAMES, axis=0) for frames in vggish.embed(list(segments))])
+    custom_features = np.stack([compute_custom_features(segment, sr=SAMPLE_RATE) for segment in segments])
+    return [vggish_features, custom_features]
 
-    segments = [audio[i * max_len:(i + 1) * max_len] for i in range(int(np.ceil(len(audio) / max_len)))]
-    segments = [np.pad(seg, (0, max_len - len(seg)), 'constant') if len(seg) < max_len else seg for seg in segments]
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        vggish_features = list(tqdm(executor.map(extract_vggish_features, segments), total=len(segments)))
-
-    vggish_features = np.array(vggish_features)
-    if len(vggish_features.shape) == 3 and vggish_features.shape[0] == 1:
-        vggish_features = np.squeeze(vggish_features, axis=0)
-    vggish_features = pad_to_length(vggish_features, target_length, axis=0)
-    print(f"VGGish feature extraction completed. Shape: {vggish_features.shape}")
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        custom_features = list(tqdm(executor.map(extract_custom_features, segments), total=len(segments)))
-
-    custom_features = np.array(custom_features)
-    if len(custom_features.shape) == 3 and custom_features.shape[0] == 1:
-        custom_features = np.squeeze(custom_features, axis=0)
-    custom_features_expanded = np.repeat(custom_features[:, np.newaxis, :], target_length, axis=1)
-    custom_features_expanded = pad_to_length(custom_features_expanded, target_length, axis=1)
-    print(f"Custom feature extraction completed. Shape: {custom_features_expanded.shape}")
-
-    if len(vggish_features.shape) == 2:
-        vggish_features = np.expand_dims(vggish_features, axis=0)
-
-    if len(custom_features_expanded.shape) == 2:
-        custom_features_expanded = np.expand_dims(custom_features_expanded, axis=0)
-
-    features = np.concatenate([vggish_features, custom_features_expanded], axis=-1)
-    print(f"Combined feature extraction completed. Shape: {features.shape}")
-
-    predictions = []
-    for feature in features:
-        feature = np.expand_dims(feature, axis=0)
-        prediction = model.predict(feature)
-        predictions.append(prediction)
+def score_audio(file_path, overlap=SEGMENT_OVERLAP):
+    """Per-segment and aggregate scores for a recording of any length, decoded block by block."""
+    try:
+        return score_file(file_path, SAMPLE_RATE, featurize_segments, model.predict, SEGMENT_SECONDS,
+                          overlap=overlap, batch_segments=SEGMENT_BATCH)
+    except Exception as e:
+        print(f"Error scoring file {file_path}: {e}")
+        return None
 
-    average_prediction = np.mean(predictions)
-    predicted_class = 'REAL' if average_prediction > 0.5 else 'FAKE'
-    return predicted_class
+def predict_audio(file_path):
+    result = score_audio(file_path)
+    if result is None or result["label"] is None:
+        # Unreadable, or every segment was below the silence threshold
+        return "Invalid audio file"
+    return result["label"]
 
 def predict_folder(folder_path):
     file_paths = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith('.wav')]
@@ -42,7 +42,6 @@ import tensorflow as tf
 from tqdm import tqdm
 import unittest
 from concurrent.futures import ThreadPoolExecutor
-import tensorflow_hub as hub
 import requests
 from tensorflow.keras.models import load_model, Sequential
 from tensorflow.keras.layers import Input, Dense, Dropout, Bidirectional, GRU, Conv1D, MaxPooling1D, BatchNormalization
@@ -52,6 +51,11 @@ from pydub import AudioSegment
 # This is the file where the credentials are stored
 import config
 
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_broadcast import tile_over_frames
+from vggish_bundle import load_vggish_in_background
+
 # Set up the IAM authenticator with the API key
 authenticator = IAMAuthenticator(config.APIKEY)
 
@@ -62,8 +66,7 @@ speech_to_text = SpeechToTextV1(authenticator=authenticator)
 speech_to_text.set_service_url(config.URL)
 
 from flask import Flask, render_template, request, jsonify, url_for, redirect, abort, session, json
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=True)
+vggish = load_vggish_in_background()
 PORT = 8080
 
 # Global Variables
@@ -125,15 +128,13 @@ def create_model(input_shape):
 input_shape = (28, 295) 
 model = create_model(input_shape)
 model.load_weights('bestbigru.h5')
+model = tile_over_frames(model, frame_dims=128)
 
 @app.route('/')
 @app.route('/home')
 def home():
     return render_template('main.html')
 
-def extract_vggish_features(audio_data):
-    return vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
-
 def extract_features(audio_data):
     print("[extract_features] : Exctracting featureses ...")
     mfcc_features = librosa.feature.mfcc(y=audio_data, sr=22050, n_mfcc=20)
@@ -192,8 +193,7 @@ def process_audio():
         audios_padded.append(padded_audio)
         print(f"Audio padded: Original length: {len(audio)}, Padded length: {len(padded_audio)}")
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        vggish_features = list(tqdm(executor.map(extract_vggish_features, audios_padded), total=len(audios_padded)))
+    vggish_features = vggish.embed(list(audios_padded))
     vggish_features = np.array(vggish_features)
     vggish_features = np.squeeze(vggish_features)
     print(f"VGGish feature extraction completed. Shape: {vggish_features.shape}")
@@ -203,18 +203,13 @@ def process_audio():
     custom_features = np.array(custom_features)
     print(f"Custom feature extraction completed. Shape: {custom_features.shape}")
 
-    # Ensure vggish_features and custom_features_expanded have the same number of dimensions
+    # A single upload loses its batch axis in the squeeze above
     if vggish_features.ndim == 2:
         vggish_features = np.expand_dims(vggish_features, axis=0)
     
-    num_time_frames = vggish_features.shape[1]
-    custom_features_expanded = np.repeat(custom_features[:, np.newaxis, :], num_time_frames, axis=1)
-    print(f"Custom features expanded. Shape: {custom_features_expanded.shape}")
-
-    features = np.concatenate([vggish_features, custom_features_expanded], axis=2)
-    print(f"Combined feature extraction completed. Shape: {features.shape}")
+    print(f"Model inputs: {vggish_features.shape} and {custom_features.shape}")
 
-    predictions = model.predict(features)
+    predictions = model.predict([vggish_features, custom_features])
     predicted_classes = (predictions > 0.5).astype("int32")
     predicted_classes = predicted_classes.flatten()  # Flatten the array
 
@@ -4,18 +4,21 @@ import tempfile
 import numpy as np
 import librosa
 import tensorflow as tf
-import tensorflow_hub as hub
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Input, Dense, Dropout, Bidirectional, GRU, Conv1D, MaxPooling1D, BatchNormalization
 from tensorflow.keras.optimizers import Adam
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import argparse
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_broadcast import tile_over_frames
+from vggish_bundle import load_vggish_in_background
 
 # Define the path to your model weights
 MODEL_PATH = 'bestbigru.h5'
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=True)
+vggish = load_vggish_in_background()
 
 # Supported file extensions
 SUPPORTED_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.aac')
@@ -70,9 +73,6 @@ def create_model(input_shape):
 
     return model
 
-def extract_vggish_features(audio_data):
-    return vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
-
 def extract_features(audio_data):
     mfcc_features = librosa.feature.mfcc(y=audio_data, sr=22050, n_mfcc=20)
     mfcc_features = np.mean(mfcc_features.T, axis=0)
@@ -123,8 +123,7 @@ def process_audio(files):
             padded_audio = audio[:max_len]
         audios_padded.append(padded_audio)
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        vggish_features = list(tqdm(executor.map(extract_vggish_features, audios_padded), total=len(audios_padded)))
+    vggish_features = vggish.embed(list(audios_padded))
     vggish_features = np.array(vggish_features)
     vggish_features = np.squeeze(vggish_features)
 
@@ -135,18 +134,16 @@ def process_audio(files):
     if vggish_features.ndim == 2:
         vggish_features = np.expand_dims(vggish_features, axis=0)
     
-    num_time_frames = vggish_features.shape[1]
-    custom_features_expanded = np.repeat(custom_features[:, np.newaxis, :], num_time_frames, axis=1)
-
-    features = np.concatenate([vggish_features, custom_features_expanded], axis=2)
+    num_time_frames, vggish_dims = vggish_features.shape[1:]
 
     # Define the model
-    model = create_model(features.shape)
+    model = create_model((len(vggish_features), num_time_frames, vggish_dims + custom_features.shape[1]))
     # Load the weights
     model.load_weights(MODEL_PATH)
+    model = tile_over_frames(model, frame_dims=vggish_dims)
     
     # Make predictions
-    predictions = model.predict(features)
+    predictions = model.predict([vggish_features, custom_features])
     predicted_classes = (predictions > 0.5).astype("int32")
     predicted_classes = predicted_classes.flatten()
 
@@ -0,0 +1,240 @@
+#export_runtime.py
+#
+# Converts the classifier (and optionally the VGGish frontend) into quantized CPU
+# runtimes and reports accuracy against latency for every variant:
+#   tflite_fp32 / tflite_fp16   TFLite, float32 or float16 weights
+#   tflite_int8                 TFLite, int8 weights with dynamic-range activations
+#   onnx_fp32 / onnx_fp16       tf2onnx, float32 or float16 graph with float32 inputs/outputs
+#   onnx_int8                   onnxruntime static int8 (QDQ, per-channel) calibrated on
+#                               a sample of the cached features
+# Calibrated full-integer TFLite conversion crashed the TFLite converter (TF 2.21) on the
+# GRU while-loops, which is why the calibrated int8 variant is the ONNX one. TFLite graphs
+# are exported with a batch of one (dynamic batches cannot be lowered either).
+# Both formats check the step axis, so the classifier is exported for the clip vector
+# length the server feeds (feature_engine.custom_feature_length(), 167 by default) rather
+# than the step count it was built with; --steps overrides it.
+#
+#     python export_runtime.py bestbigru.h5 --calibration X_test.npy --labels y_test.npy
+#
+# Serve a variant with MODEL_BACKEND=tflite|onnx and MODEL_PATH=<exported file>.
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+from clip_broadcast import with_steps
+from feature_engine import custom_feature_length
+from runtime_backends import OnnxModel, TFLiteModel
+
+# Global Variables
+OUTPUT_DIR = 'exported_models'
+EXPORT_MODES = ('fp32', 'fp16', 'int8')
+CALIBRATION_SAMPLES = 100
+ONNX_OPSET = 17
+VGGISH_EXPORT_SECONDS = 10
+
+
+def load_features(path, input_shape):
+    """Model-input features from one (N, frames, dims) .npy file or a directory of per-sample .npy files."""
+    if os.path.isdir(path):
+        samples = [np.load(p) for p in sorted(glob.glob(os.path.join(path, '**', '*.npy'), recursive=True))]
+        samples = [s for s in samples if s.shape == tuple(input_shape)]
+        if not samples:
+            raise ValueError(f"No cached features of shape {tuple(input_shape)} under {path}")
+        return np.stack(samples).astype(np.float32)
+    return np.load(path).astype(np.float32)
+
+
+def _frozen_function(fn, input_shape, name='features'):
+    spec = tf.TensorSpec(input_shape, tf.float32, name=name)
+    return convert_variables_to_constants_v2(tf.function(fn, input_signature=[spec]).get_concrete_function())
+
+
+def _convert_tflite(concrete_function, mode):
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_function])
+    if mode != 'fp32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def export_tflite(model, output_dir, stem, modes=EXPORT_MODES):
+    frozen = _frozen_function(lambda x: model(x, training=False), (1,) + tuple(model.input_shape[1:]))
+    paths = {}
+    for mode in modes:
+        path = os.path.join(output_dir, f"{stem}_{mode}.tflite")
+        with open(path, 'wb') as f:
+            f.write(_convert_tflite(frozen, mode))
+        paths[f"tflite_{mode}"] = path
+    return paths
+
+
+def export_onnx(model, output_dir, stem, calibration, modes=EXPORT_MODES):
+    import onnx
+    import tf2onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    spec = tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='features')
+    fn = tf.function(lambda x: model(x, training=False), input_signature=[spec])
+    fp32_path = os.path.join(output_dir, f"{stem}_fp32.onnx")
+    tf2onnx.convert.from_function(fn, input_signature=[spec], opset=ONNX_OPSET, output_path=fp32_path)
+    paths = {"onnx_fp32": fp32_path}
+
+    if 'fp16' in modes:
+        paths["onnx_fp16"] = os.path.join(output_dir, f"{stem}_fp16.onnx")
+        onnx.save(convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True), paths["onnx_fp16"])
+    if 'int8' not in modes:
+        return paths
+
+    class FeatureReader(CalibrationDataReader):
+        def __init__(self):
+            self._samples = iter(calibration)
+
+        def get_next(self):
+            sample = next(self._samples, None)
+            return None if sample is None else {'features': sample[np.newaxis]}
+
+    paths["onnx_int8"] = os.path.join(output_dir, f"{stem}_int8.onnx")
+    quantize_static(fp32_path, paths["onnx_int8"], FeatureReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QInt8, weight_type=QuantType.QInt8, per_channel=True)
+    return paths
+
+
+def export_vggish_tflite(output_dir, seconds=VGGISH_EXPORT_SECONDS):
+    """VGGish frontend as TFLite for a fixed clip length (the waveform length must be static)."""
+    import tensorflow_hub as hub
+    from vggish_bundle import resolve_vggish
+
+    vggish = hub.load(resolve_vggish())
+    frozen = _frozen_function(lambda waveform: vggish(waveform), (int(seconds * 16000),), name='waveform')
+    paths = {}
+    for mode in ('fp32', 'fp16', 'int8'):
+        path = os.path.join(output_dir, f"vggish_{seconds}s_{mode}.tflite")
+        with open(path, 'wb') as f:
+            f.write(_convert_tflite(frozen, mode))
+        paths[f"vggish_tflite_{mode}"] = path
+    return vggish, paths
+
+
+def _time_per_sample(predict, features, batch_size, repeats):
+    batch = features[:batch_size]
+    predict(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict(batch)
+    return (time.perf_counter() - start) / repeats / len(batch) * 1000
+
+
+def evaluate(name, predict, features, reference, labels, repeats, path=None):
+    predictions = np.asarray(predict(features)).ravel()
+    result = {
+        "variant": name,
+        "size_mb": os.path.getsize(path) / 1e6 if path else None,
+        "ms_per_sample_bs1": _time_per_sample(predict, features, 1, repeats),
+        "ms_per_sample_bs32": _time_per_sample(predict, features, 32, max(1, repeats // 8)),
+        "max_abs_diff": float(np.max(np.abs(predictions - reference))),
+        "label_agreement": float(np.mean((predictions > 0.5) == (reference > 0.5))),
+        "accuracy": float(np.mean((predictions > 0.5) == labels)) if labels is not None else None,
+    }
+    return result
+
+
+def evaluate_vggish(vggish, paths, repeats, clips=4):
+    """Embedding error and per-clip latency of each VGGish TFLite variant against the SavedModel."""
+    waveforms = np.random.default_rng(1).uniform(-1, 1, (clips, VGGISH_EXPORT_SECONDS * 16000)).astype(np.float32)
+    reference = [vggish(waveform).numpy() for waveform in waveforms]
+    results = []
+    for name, path in paths.items():
+        interpreter = TFLiteModel(path).interpreter
+        input_index = interpreter.get_input_details()[0]['index']
+        output_index = interpreter.get_output_details()[0]['index']
+
+        def embed(waveform):
+            interpreter.set_tensor(input_index, waveform)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
+
+        errors = [np.max(np.abs(embed(w) - r)) for w, r in zip(waveforms, reference)]
+        start = time.perf_counter()
+        for _ in range(max(1, repeats // 10)):
+            embed(waveforms[0])
+        ms_per_clip = (time.perf_counter() - start) / max(1, repeats // 10) * 1000
+        results.append({"variant": name, "size_mb": os.path.getsize(path) / 1e6, "ms_per_clip": ms_per_clip,
+                        "max_abs_diff": float(np.max(errors))})
+        print(f"{name:<20} {results[-1]['size_mb']:>8.2f} MB {ms_per_clip:>9.2f} ms/clip  max diff {results[-1]['max_abs_diff']:.2e}")
+    return results
+
+
+def print_report(results):
+    print(f"{'variant':<14} {'size MB':>8} {'ms bs=1':>8} {'ms bs=32':>9} {'max diff':>9} {'agree':>7} {'accuracy':>9}")
+    for r in results:
+        size = f"{r['size_mb']:.2f}" if r['size_mb'] is not None else '-'
+        accuracy = f"{r['accuracy']:.4f}" if r.get('accuracy') is not None else '-'
+        print(f"{r['variant']:<14} {size:>8} {r['ms_per_sample_bs1']:>8.2f} {r['ms_per_sample_bs32']:>9.2f} "
+              f"{r['max_abs_diff']:>9.2e} {r['label_agreement']:>7.2%} {accuracy:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export quantized TFLite/ONNX runtimes and report accuracy vs latency.')
+    parser.add_argument('model', help='Full-model .h5 / .keras file (the original or a fuse_model.py export)')
+    parser.add_argument('--formats', default='tflite,onnx', help='Comma-separated: tflite, onnx')
+    parser.add_argument('--calibration', help='Cached features: (N, frames, dims) .npy or a directory of per-sample .npy files')
+    parser.add_argument('--labels', help='Labels (.npy, 1 = REAL) for the evaluation features')
+    parser.add_argument('--calibration-samples', type=int, default=CALIBRATION_SAMPLES, help='Samples used for int8 calibration')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='Where exported models and the report go')
+    parser.add_argument('--repeats', type=int, default=50, help='Timed runs per latency measurement')
+    parser.add_argument('--steps', type=int, default=custom_feature_length(), help='Step axis of the exported input (the served clip vector length)')
+    parser.add_argument('--vggish', action='store_true', help='Also export the VGGish frontend from the local bundle')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    model = with_steps(tf.keras.models.load_model(args.model, compile=False), args.steps)
+    input_shape = tuple(model.input_shape[1:])
+    if args.calibration:
+        features = load_features(args.calibration, input_shape)
+    else:
+        print("[main] : No --calibration features given, using random inputs (latency only, accuracy is meaningless)")
+        features = np.random.default_rng(0).standard_normal((args.calibration_samples + 64,) + input_shape).astype(np.float32)
+    labels = np.load(args.labels).ravel() if args.labels else None
+
+    # Calibrate on the first samples and evaluate on the rest, so the report is held-out where possible
+    calibration = features[:args.calibration_samples]
+    if len(features) > len(calibration):
+        features = features[len(calibration):]
+        labels = labels[len(calibration):] if labels is not None else None
+    reference = model.predict(features, verbose=0).ravel()
+
+    stem = os.path.splitext(os.path.basename(args.model))[0]
+    paths = {}
+    formats = args.formats.split(',')
+    if 'tflite' in formats:
+        paths.update(export_tflite(model, args.output_dir, stem))
+    if 'onnx' in formats:
+        paths.update(export_onnx(model, args.output_dir, stem, calibration))
+
+    results = [evaluate('keras', lambda x: model.predict(x, verbose=0), features, reference, labels, args.repeats, args.model)]
+    for name, path in paths.items():
+        runtime = TFLiteModel(path) if path.endswith('.tflite') else OnnxModel(path)
+        results.append(evaluate(name, runtime.predict, features, reference, labels, args.repeats, path))
+
+    print_report(results)
+    report = {"classifier": results}
+    if args.vggish:
+        vggish, vggish_paths = export_vggish_tflite(args.output_dir)
+        report["vggish"] = evaluate_vggish(vggish, vggish_paths, args.repeats)
+
+    report_path = os.path.join(args.output_dir, 'quantization_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[main] : Report written to {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#feature_engine.py
+#
+# Computes the custom feature vector (MFCC, chroma, spectral contrast and mel means)
+# from a single STFT per clip. The filterbanks and the DCT basis only depend on the
+# analysis configuration, so they are built once per (sr, n_fft) and reused.
+#
+# The output matches the four separate librosa.feature calls it replaces to within
+# FEATURE_TOLERANCE, relative and absolute, per element on float32 audio (typically ~1e-6).
+from functools import lru_cache
+
+import numpy as np
+import librosa
+import scipy.fft
+
+# Global Variables
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 20
+N_CHROMA = 12
+N_CONTRAST_BANDS = 6
+CONTRAST_FMIN = 200.0
+CONTRAST_QUANTILE = 0.02
+FEATURE_TOLERANCE = 1e-5
+
+
+@lru_cache(maxsize=16)
+def mel_basis(sr, n_fft, n_mels=N_MELS):
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+
+@lru_cache(maxsize=16)
+def dct_basis(n_mels=N_MELS, n_mfcc=N_MFCC):
+    # Rows of the orthonormal DCT-II matrix, so that dct_basis @ S == scipy.fft.dct(S, axis=0, norm='ortho')[:n_mfcc]
+    return scipy.fft.dct(np.eye(n_mels), type=2, axis=0, norm='ortho')[:n_mfcc]
+
+
+@lru_cache(maxsize=256)
+def chroma_basis(sr, n_fft, tuning, n_chroma=N_CHROMA):
+    # estimate_tuning is quantised to 0.01 bins, so the number of distinct keys per (sr, n_fft) stays small
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning, n_chroma=n_chroma)
+
+
+@lru_cache(maxsize=16)
+def contrast_bands(sr, n_fft, n_bands=N_CONTRAST_BANDS, fmin=CONTRAST_FMIN, quantile=CONTRAST_QUANTILE):
+    """Return (bin indices, quantile count) per octave band, laid out as in librosa.feature.spectral_contrast."""
+    freq = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    octa = np.zeros(n_bands + 2)
+    octa[1:] = fmin * (2.0 ** np.arange(0, n_bands + 1))
+    if np.any(octa[:-1] >= 0.5 * sr):
+        raise ValueError("Frequency band exceeds Nyquist. Reduce either fmin or n_bands.")
+
+    bands = []
+    for k, (f_low, f_high) in enumerate(zip(octa[:-1], octa[1:])):
+        current_band = np.logical_and(freq >= f_low, freq <= f_high)
+        idx = np.flatnonzero(current_band)
+        if k > 0:
+            current_band[idx[0] - 1] = True
+        if k == n_bands:
+            current_band[idx[-1] + 1:] = True
+
+        bins = np.flatnonzero(current_band)
+        if k < n_bands:
+            bins = bins[:-1]
+        count = int(np.maximum(np.rint(quantile * np.sum(current_band)), 1))
+        bands.append((bins, count))
+    return tuple(bands)
+
+
+def feature_config_key(sr, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH, **extra):
+    """Stable string describing everything that changes the feature values, for use in cache keys."""
+    config = dict(sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, n_mels=N_MELS, **extra)
+    return ";".join(f"{name}={config[name]}" for name in sorted(config))
+
+
+def custom_feature_length(n_mfcc=N_MFCC):
+    """Length of the compute_custom_features vector: n_mfcc + 12 chroma + 7 contrast bands + 128 mel means."""
+    return n_mfcc + N_CHROMA + N_CONTRAST_BANDS + 1 + N_MELS
+
+
+def magnitude_spectrogram(audio_data, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    return np.abs(librosa.stft(y=audio_data, n_fft=n_fft, hop_length=hop_length))
+
+
+def contrast_peak_valley(magnitude, sr, n_fft=N_FFT):
+    """Per-frame mean of the top and bottom quantile of every octave band, before conversion to dB."""
+    bands = contrast_bands(sr, n_fft)
+    valley = np.zeros((len(bands), magnitude.shape[1]))
+    peak = np.zeros_like(valley)
+    for k, (bins, count) in enumerate(bands):
+        sortedr = np.sort(magnitude[bins], axis=0)
+        valley[k] = np.mean(sortedr[:count], axis=0)
+        peak[k] = np.mean(sortedr[-count:], axis=0)
+    return peak, valley
+
+
+def spectral_contrast_from_magnitude(magnitude, sr, n_fft=N_FFT):
+    peak, valley = contrast_peak_valley(magnitude, sr, n_fft=n_fft)
+    return librosa.power_to_db(peak) - librosa.power_to_db(valley)
+
+
+def compute_custom_features(audio_data, sr=22050, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """Return the concatenated MFCC, chroma, spectral contrast and mel means (n_mfcc + 12 + 7 + 128 values)."""
+    magnitude = magnitude_spectrogram(audio_data, n_fft=n_fft, hop_length=hop_length)
+    power = magnitude ** 2
+
+    mel_spectrogram = mel_basis(sr, n_fft) @ power
+    mfcc_features = dct_basis(N_MELS, n_mfcc) @ librosa.power_to_db(mel_spectrogram)
+
+    tuning = float(librosa.estimate_tuning(S=power, sr=sr, bins_per_octave=N_CHROMA))
+    chroma_features = librosa.util.normalize(chroma_basis(sr, n_fft, tuning) @ power, norm=np.inf, axis=0)
+
+    spectral_contrast = spectral_contrast_from_magnitude(magnitude, sr, n_fft=n_fft)
+
+    return np.concatenate([
+        np.mean(mfcc_features, axis=1),
+        np.mean(chroma_features, axis=1),
+        np.mean(spectral_contrast, axis=1),
+        np.mean(mel_spectrogram, axis=1),
+    ])
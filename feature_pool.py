@@ -0,0 +1,206 @@
+#feature_pool.py
+#
+# Persistent worker processes for the custom-feature DSP stage. Clips are copied once into
+# a shared memory block and workers read them in place, so no PCM is pickled across the
+# process boundary; only the small feature vectors come back. A large map() goes through
+# in chunks of at most FEATURE_SHM_BYTES (a single longer clip gets a block of its own),
+# each block freed before the next is made, so /dev/shm (64 MB by default in Docker)
+# never has to hold a whole training set. Clips are handed to the
+# workers one per idle worker, shortest first with aging (scheduling.py); the rest wait in
+# a heap here, so a long file never holds up the short clips queued behind it. Workers are
+# fresh interpreters (worker_process.py), never forks of the caller; a worker that dies is
+# replaced and only the clip it was working on fails.
+import heapq
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from itertools import count
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from deadline import DeadlineExceeded
+from feature_engine import compute_custom_features, N_MFCC
+from scheduling import WaitStats, sjf_key
+from worker_process import WorkerProcess
+
+# Global Variables
+FEATURE_WORKERS = int(os.environ.get('FEATURE_WORKERS', os.cpu_count() or 1))
+FEATURE_SHM_BYTES = int(os.environ.get('FEATURE_SHM_BYTES', str(32 * 1024 * 1024)))
+
+
+def _extract_from_shared_memory(shm_name, offset, length, sr, n_mfcc, expires_at=None):
+    # CLOCK_MONOTONIC is system-wide, so the parent's deadline holds here too
+    if expires_at is not None and time.monotonic() >= expires_at:
+        raise DeadlineExceeded("Request deadline passed while queued for feature extraction")
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # The parent owns the block; stop the tracker from also unlinking it on our behalf (Python < 3.13)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    try:
+        audio_data = np.ndarray((length,), dtype=np.float32, buffer=shm.buf, offset=offset)
+        features = compute_custom_features(audio_data, sr=sr, n_mfcc=n_mfcc)
+        del audio_data
+        return features
+    finally:
+        shm.close()
+
+
+def _feature_worker(conn):
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        if args is None:
+            return
+        try:
+            conn.send(('ok', _extract_from_shared_memory(*args)))
+        except Exception as e:
+            conn.send(('error', e))
+
+
+def _unlink_when_done(shm, futures):
+    # Clips already on a worker can't be interrupted and may not have attached to the block yet
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shm.unlink()
+
+    if not futures:
+        shm.unlink()
+    for future in futures:
+        future.add_done_callback(done)
+
+
+class FeaturePool:
+    """Process pool that extracts custom features from clips passed through shared memory."""
+
+    def __init__(self, max_workers=FEATURE_WORKERS, n_mfcc=N_MFCC, max_shm_bytes=FEATURE_SHM_BYTES):
+        self.max_workers = max_workers
+        self.n_mfcc = n_mfcc
+        self.max_shm_bytes = max_shm_bytes
+        self.restarts = 0
+        self.waits = WaitStats()
+        self._queue = []
+        self._sequence = count()
+        self._queue_ready = threading.Condition()
+        self._workers = [WorkerProcess(_feature_worker) for _ in range(max_workers)]
+        for index in range(max_workers):
+            threading.Thread(target=self._dispatch, args=(index,), name=f"feature-dispatch-{index}", daemon=True).start()
+        print(f"[FeaturePool] : Started {max_workers} feature workers")
+
+    def _restart_worker(self, index):
+        worker = self._workers[index]
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+        worker.conn.close()
+        self.restarts += 1
+        self._workers[index] = WorkerProcess(_feature_worker)
+        print(f"[FeaturePool] : Restarted feature worker {index} (exit code {worker.exitcode})")
+
+    def _submit(self, audio_seconds, *args):
+        future = Future()
+        queued_at = time.monotonic()
+        with self._queue_ready:
+            heapq.heappush(self._queue, (sjf_key(audio_seconds, queued_at), next(self._sequence), audio_seconds, queued_at, args, future))
+            self._queue_ready.notify()
+        return future
+
+    def _dispatch(self, index):
+        # One thread per worker, taking the next clip from the heap only once its worker is free
+        while True:
+            with self._queue_ready:
+                self._queue_ready.wait_for(lambda: self._queue)
+                _, _, audio_seconds, queued_at, args, future = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.waits.record(audio_seconds, time.monotonic() - queued_at)
+
+            if not self._workers[index].is_alive():
+                self._restart_worker(index)
+            conn = self._workers[index].conn
+            try:
+                conn.send(args)
+                status, value = conn.recv()
+            except (EOFError, OSError) as e:
+                # The worker died mid-clip: fail this clip only and replace the worker
+                print(f"[FeaturePool] : Feature worker {index} failed: {e!r}")
+                traceback.print_exc()
+                future.set_exception(RuntimeError(f"Feature worker failed: {e!r}"))
+                self._restart_worker(index)
+                continue
+            if status == 'ok':
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self):
+        with self._queue_ready:
+            queued = len(self._queue)
+        return {
+            "workers": self.max_workers,
+            "alive": sum(1 for worker in self._workers if worker.is_alive()),
+            "queued": queued,
+            "restarts": self.restarts,
+            "queue_wait": self.waits.summary(),
+        }
+
+    def map(self, audios, sr=22050, deadline=None):
+        """Features of every clip, in order, passing at most max_shm_bytes of clips through shared memory at a time."""
+        features = []
+        chunk, chunk_bytes = [], 0
+        for audio in audios:
+            audio_bytes = len(audio) * 4  # as float32
+            if chunk and chunk_bytes + audio_bytes > self.max_shm_bytes:
+                features.extend(self._map_chunk(chunk, sr, deadline))
+                chunk, chunk_bytes = [], 0
+            chunk.append(audio)
+            chunk_bytes += audio_bytes
+        if chunk:
+            features.extend(self._map_chunk(chunk, sr, deadline))
+        return features
+
+    def _map_chunk(self, audios, sr, deadline):
+        audios = [np.ascontiguousarray(audio, dtype=np.float32) for audio in audios]
+        total_bytes = max(sum(audio.nbytes for audio in audios), 1)
+        shm = shared_memory.SharedMemory(create=True, size=total_bytes)
+        futures = []
+        try:
+            offset = 0
+            for audio in audios:
+                np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf, offset=offset)[:] = audio
+                futures.append(self._submit(
+                    len(audio) / sr, shm.name, offset, len(audio), sr, self.n_mfcc,
+                    deadline.expires_at if deadline is not None else None))
+                offset += audio.nbytes
+            try:
+                if deadline is None:
+                    return [future.result() for future in futures]
+                return [deadline.wait(future, "feature extraction") for future in futures]
+            except BaseException:
+                # Clips still waiting for a worker are dropped; running ones can't be interrupted
+                for future in futures:
+                    future.cancel()
+                raise
+        finally:
+            shm.close()
+            _unlink_when_done(shm, futures)
+
+    def extract(self, audio_data, sr=22050, deadline=None):
+        return self.map([audio_data], sr=sr, deadline=deadline)[0]
+
+    def shutdown(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.join(timeout=1)
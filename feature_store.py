@@ -0,0 +1,78 @@
+#feature_store.py
+#
+# Disk-backed store of per-file arrays keyed by the SHA-256 of the file contents. Each
+# store is a namespace (e.g. 'vggish', 'custom') plus a config string; every distinct
+# config gets its own directory, so changing one parameter only invalidates the
+# namespaces whose config includes it.
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# Global Variables
+FEATURE_STORE_DIR = os.environ.get('FEATURE_STORE_DIR', 'feature_store')
+
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """One .npy file per content hash under <root>/<name>/<config digest>/."""
+
+    def __init__(self, name, config, root=FEATURE_STORE_DIR):
+        self.name = name
+        self.config = config
+        config_digest = hashlib.sha256(config.encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(root, name, config_digest)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Keep the human-readable config next to the arrays it describes
+        config_path = os.path.join(self.directory, 'config.txt')
+        if not os.path.exists(config_path):
+            with open(config_path, 'w') as f:
+                f.write(config + '\n')
+
+    def _path(self, content_hash):
+        return os.path.join(self.directory, content_hash + '.npy')
+
+    def __contains__(self, content_hash):
+        return os.path.exists(self._path(content_hash))
+
+    def load(self, content_hash):
+        try:
+            return np.load(self._path(content_hash))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[FeatureStore] : Ignoring unreadable {self.name} entry {content_hash}: {e}")
+            return None
+
+    def save(self, content_hash, array):
+        # Write to a temp file and rename so readers never see a partial array
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.npy.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+            os.replace(temp_path, self._path(content_hash))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def map(self, content_hashes, items, compute):
+        """Return one array per hash, calling compute(list of items) only for the hashes not yet stored."""
+        results = [self.load(content_hash) for content_hash in content_hashes]
+        missing = [i for i, result in enumerate(results) if result is None]
+        print(f"[FeatureStore] : {self.name}: {len(results) - len(missing)} cached, {len(missing)} to compute")
+        if missing:
+            computed = compute([items[i] for i in missing])
+            for i, array in zip(missing, computed):
+                self.save(content_hashes[i], array)
+                results[i] = array
+        return results
@@ -6,24 +6,24 @@ import numpy as np
 import librosa
 import tempfile
 import os
-import tensorflow_hub as hub
+import sys
 from concurrent.futures import ThreadPoolExecutor
 
+# Local runs import vggish_bundle.py (and vggish_batch.py) from the repo root; the firebase.json
+# predeploy step copies them into this directory, which is deployed on its own
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_broadcast import tile_over_frames
+from vggish_bundle import load_vggish_in_background
+
 # Initialize Flask app
 app = Flask(__name__)
 
 # Load the model
 print("Loading model...")
 model = tf.keras.models.load_model('bestbigru.h5')
-vggish_model_handle = 'https://tfhub.dev/google/vggish/1'
-vggish_layer = hub.KerasLayer(vggish_model_handle, trainable=True)
-print("Model and VGGish layer loaded")
-
-def extract_vggish_features(audio_data):
-    print("Extracting VGGish features")
-    features = vggish_layer(tf.convert_to_tensor(audio_data, dtype=tf.float32)).numpy()
-    print("VGGish features shape:", features.shape)
-    return features
+model = tile_over_frames(model, frame_dims=128)
+vggish = load_vggish_in_background()
+print("Model loaded, VGGish bundle verified and loading in the background")
 
 def extract_features(audio_data):
     print("Extracting custom features")
@@ -77,9 +77,8 @@ def process_audio():
     audios_padded = [np.pad(audio, (0, max_len - len(audio)), 'constant') if len(audio) < max_len else audio[:max_len] for audio in audios]
     print(f"Padded audios length: {len(audios_padded)}")
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        print("Extracting VGGish features...")
-        vggish_features = list(executor.map(extract_vggish_features, audios_padded))
+    print("Extracting VGGish features...")
+    vggish_features = vggish.embed(list(audios_padded))
     vggish_features = np.array(vggish_features)
     vggish_features = np.squeeze(vggish_features)
     print("VGGish features extracted")
@@ -93,15 +92,11 @@ def process_audio():
     if vggish_features.ndim == 2:
         vggish_features = np.expand_dims(vggish_features, axis=0)
     
-    num_time_frames = vggish_features.shape[1]
-    custom_features_expanded = np.repeat(custom_features[:, np.newaxis, :], num_time_frames, axis=1)
-
-    features = np.concatenate([vggish_features, custom_features_expanded], axis=2)
-    print(f"Features shape: {features.shape}")
+    print(f"Model inputs: {vggish_features.shape} and {custom_features.shape}")
 
     # Make predictions
     print("Making predictions...")
-    predictions = model.predict(features)
+    predictions = model.predict([vggish_features, custom_features])
     predicted_classes = (predictions > 0.5).astype("int32").flatten()
     labels = ['FAKE', 'REAL']
     predicted_labels = [labels[pred] for pred in predicted_classes]
@@ -5,12 +5,18 @@ from pydub import AudioSegment
 from flask import Flask, render_template, request, jsonify
 from cors_config import init_cors
 import os
+import sys
 import tempfile
 import traceback
 
+# clip_broadcast.py lives at the repo root; the firebase.json predeploy step copies it in for deploys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_broadcast import tile_over_channels
+
 # Global Variables
 PORT = 8080
 SUPPORTED_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.aac', '.3gp')
+CUSTOM_FEATURES = 20 + 12 + 7 + 128  # MFCC, chroma, spectral contrast and mel means from extract_custom_features
 
 app = Flask(__name__)
 init_cors(app)
@@ -52,6 +58,7 @@ def create_model(input_shape):
 input_shape = (28, 295)
 model = create_model(input_shape)
 model.load_weights('bestbigru.h5')
+model = tile_over_channels(model, CUSTOM_FEATURES)
 
 @app.route('/')
 @app.route('/home')
@@ -105,7 +112,8 @@ def extract_custom_features(audio_data):
 def process_audio():
     print("[process_audio] : Processing audio files")
     files = request.files.getlist('audio_files')
-    audios = []
+    filenames = []
+    batch = []
 
     if not files:
         return jsonify({"error": "No files found in the request"}), 400
@@ -129,21 +137,8 @@ def process_audio():
                 custom_features = extract_custom_features(audio_data)
                 print(f"[process_audio] : Custom features extracted with shape {custom_features.shape}")
 
-                # Reshape features for prediction
-                num_time_frames = input_shape[1]
-                custom_features_expanded = np.repeat(custom_features[:, np.newaxis], num_time_frames, axis=1)
-                custom_features_expanded = np.expand_dims(custom_features_expanded, axis=0)  # Add batch dimension
-
-                # Make prediction
-                prediction = model.predict(custom_features_expanded)
-                predicted_class = int(prediction > 0.5)  # Convert sigmoid output to binary class
-                print(f"[process_audio] : Prediction made: {prediction}")
-
-                # Map predictions to labels
-                labels = ['FAKE', 'REAL']
-                predicted_label = labels[predicted_class]
-
-                audios.append({"filename": filename, "prediction": predicted_label})
+                filenames.append(filename)
+                batch.append(custom_features)
             except Exception as e:
                 print(f"[process_audio] : Error processing file {filename}: {e}")
                 traceback.print_exc()
@@ -151,6 +146,21 @@ def process_audio():
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
+    audios = []
+    if batch:
+        try:
+            # One predict call for every file in the upload
+            predictions = model.predict(np.stack(batch)).ravel()
+            print(f"[process_audio] : Predictions made: {predictions}")
+
+            # Map predictions to labels
+            labels = ['FAKE', 'REAL']
+            audios = [{"filename": filename, "prediction": labels[int(prediction > 0.5)]}
+                      for filename, prediction in zip(filenames, predictions)]
+        except Exception as e:
+            print(f"[process_audio] : Error classifying {len(batch)} files: {e}")
+            traceback.print_exc()
+
     return jsonify({
         "message": "Features extracted and classified successfully",
         "audios": audios
@@ -0,0 +1,241 @@
+#fuse_model.py
+#
+# Export an inference-only copy of a trained Sequential classifier. Dropout layers are
+# dropped (they are the identity at inference) and every BatchNormalization is folded
+# into a neighbouring kernel where that is exact:
+#   - backwards into a Conv1D/Dense with a linear activation, or
+#   - forwards into the next Dense, 'valid' Conv1D or GRU/LSTM input kernel, across
+#     Dropout, GlobalAveragePooling1D and (when every scale is positive, so the order of
+#     values is kept) MaxPooling1D / GlobalMaxPooling1D.
+# In create_model every BN sits after a ReLU, so the forward fold is the one that
+# applies. A BN in front of a 'same'-padded Conv1D is kept: its shift would leak into
+# the zero padding at the edges.
+#
+#     python fuse_model.py bestbigru.h5 --output bestbigru_fused.h5 --features X_test.npy
+#
+# The result is a full-model .h5 that tf.keras.models.load_model and
+# numpy_engine.NumpyModel both read; it is checked against the original model on the
+# held-out features before it is accepted. The reference is the original run by Keras
+# when TensorFlow is installed, so a mistake in numpy_engine's reader or forward pass
+# can't cancel out on both sides of the comparison.
+import argparse
+import json
+import zipfile
+
+import h5py
+import numpy as np
+
+from numpy_engine import NumpyModel, read_model
+
+# Global Variables
+DEFAULT_OUTPUT = 'bestbigru_fused.h5'
+FUSE_TOLERANCE = 1e-4
+IDENTITY_LAYERS = ('Dropout', 'SpatialDropout1D', 'GaussianNoise')
+
+
+def _batch_norm_affine(config, weights):
+    weights = [np.asarray(w, dtype=np.float64) for w in weights]
+    gamma = weights.pop(0) if config.get('scale', True) else 1.0
+    beta = weights.pop(0) if config.get('center', True) else 0.0
+    mean, variance = weights
+    scale = gamma / np.sqrt(variance + config.get('epsilon', 1e-3))
+    return scale, beta - mean * scale
+
+
+def _output_rank(class_name, config, rank):
+    if class_name in ('GlobalMaxPooling1D', 'GlobalAveragePooling1D'):
+        return rank - 1
+    if class_name in ('GRU', 'LSTM'):
+        return rank if config.get('return_sequences', False) else rank - 1
+    if class_name == 'Bidirectional':
+        return rank if config['layer']['config'].get('return_sequences', False) else rank - 1
+    if class_name == 'Flatten':
+        return 2
+    return rank
+
+
+def _on_channel_axis(config, rank):
+    axis = np.atleast_1d(config.get('axis', -1))
+    return len(axis) == 1 and axis[0] % rank == rank - 1
+
+
+def _passes_through(class_name, scale):
+    if class_name in IDENTITY_LAYERS or class_name == 'GlobalAveragePooling1D':
+        return True
+    return class_name in ('MaxPooling1D', 'GlobalMaxPooling1D') and bool(np.all(scale > 0))
+
+
+def _with_bias(config, weights, bias_shape):
+    """Kernel layers without a bias get a zero one so a BN shift has somewhere to go."""
+    if config.get('use_bias', True):
+        return config, [np.asarray(w, dtype=np.float64) for w in weights]
+    return dict(config, use_bias=True), [np.asarray(w, dtype=np.float64) for w in weights] + [np.zeros(bias_shape)]
+
+
+def _fold_into_producer(spec, scale, shift):
+    class_name, config, weights = spec
+    if class_name not in ('Dense', 'Conv1D') or config.get('activation', 'linear') not in ('linear', None):
+        return None
+    config, weights = _with_bias(config, weights, weights[0].shape[-1])
+    kernel, bias = weights[0], weights[1]
+    return class_name, config, [kernel * scale, bias * scale + shift]
+
+
+def _fold_into_recurrent(class_name, config, weights, scale, shift):
+    kernel = weights[0]
+    bias = np.asarray(weights[2], dtype=np.float64).copy() if config.get('use_bias', True) else None
+    if bias is None:
+        return None
+    if class_name == 'GRU' and config.get('reset_after', True):
+        bias[0] += shift @ kernel
+    else:
+        bias += shift @ kernel
+    return [kernel * scale[:, None], weights[1], bias]
+
+
+def _fold_into_consumer(spec, scale, shift):
+    class_name, config, weights = spec
+    if class_name == 'Dense':
+        config, weights = _with_bias(config, weights, weights[0].shape[-1])
+        kernel, bias = weights
+        return class_name, config, [kernel * scale[:, None], bias + shift @ kernel]
+    if class_name == 'Conv1D' and config.get('padding', 'valid') == 'valid':
+        config, weights = _with_bias(config, weights, weights[0].shape[-1])
+        kernel, bias = weights
+        return class_name, config, [kernel * scale[None, :, None], bias + np.einsum('c,kcf->f', shift, kernel)]
+    if class_name in ('GRU', 'LSTM'):
+        folded = _fold_into_recurrent(class_name, config, [np.asarray(w, dtype=np.float64) for w in weights], scale, shift)
+        return None if folded is None else (class_name, config, folded)
+    if class_name == 'Bidirectional':
+        inner = config['layer']
+        half = len(weights) // 2
+        backward_config = config['backward_layer']['config'] if config.get('backward_layer') else inner['config']
+        forward = _fold_into_recurrent(inner['class_name'], inner['config'], [np.asarray(w, dtype=np.float64) for w in weights[:half]], scale, shift)
+        backward = _fold_into_recurrent(inner['class_name'], backward_config, [np.asarray(w, dtype=np.float64) for w in weights[half:]], scale, shift)
+        if forward is None or backward is None:
+            return None
+        return class_name, config, forward + backward
+    return None
+
+
+def fuse_layers(specs, input_rank=3):
+    """Return (fused specs, folded BN count, kept BN count, dropped identity layer count)."""
+    layers = [spec for spec in specs if spec[0] not in IDENTITY_LAYERS]
+    dropped = len(specs) - len(layers)
+    fused, folded, kept = [], 0, 0
+    rank = input_rank
+    for index, spec in enumerate(layers):
+        class_name, config, weights = spec
+        rank = _output_rank(class_name, config, rank)
+        if class_name != 'BatchNormalization':
+            fused.append(spec)
+            continue
+
+        scale, shift = _batch_norm_affine(config, weights)
+        if _on_channel_axis(config, rank):
+            producer = _fold_into_producer(fused[-1], scale, shift) if fused else None
+            if producer is not None:
+                fused[-1] = producer
+                folded += 1
+                continue
+
+            consumer_index = index + 1
+            while consumer_index < len(layers) and _passes_through(layers[consumer_index][0], scale):
+                consumer_index += 1
+            consumer = _fold_into_consumer(layers[consumer_index], scale, shift) if consumer_index < len(layers) else None
+            if consumer is not None:
+                layers[consumer_index] = consumer
+                folded += 1
+                continue
+
+        fused.append(spec)
+        kept += 1
+    return fused, folded, kept, dropped
+
+
+def _source_keras_version(path):
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read('metadata.json')).get('keras_version', '2.15.0')
+    with h5py.File(path, 'r') as f:
+        version = f.attrs.get('keras_version', '2.15.0')
+    return version.decode('utf-8') if isinstance(version, bytes) else version
+
+
+def save_fused_model(path, specs, input_shape, keras_version, source):
+    """Write a full-model .h5 in the layout Keras model.save() uses, so load_model reads it as well."""
+    layers = [{"class_name": "InputLayer",
+               "config": {"batch_input_shape": list(input_shape), "dtype": "float32", "sparse": False, "name": "input"}}]
+    layers += [{"class_name": class_name, "config": config} for class_name, config, _ in specs]
+    model_config = {"class_name": "Sequential", "config": {"name": "fused", "layers": layers}}
+
+    with h5py.File(path, 'w') as f:
+        f.attrs['keras_version'] = keras_version
+        f.attrs['backend'] = 'tensorflow'
+        f.attrs['model_config'] = json.dumps(model_config)
+        f.attrs['fused_from'] = source
+        weights_group = f.create_group('model_weights')
+        weights_group.attrs['keras_version'] = keras_version
+        weights_group.attrs['backend'] = 'tensorflow'
+        weights_group.attrs['layer_names'] = np.array([layer['config']['name'].encode('utf-8') for layer in layers])
+        weights_group.create_group('input').attrs['weight_names'] = np.array([], dtype='S1')
+        for class_name, config, weights in specs:
+            group = weights_group.create_group(config['name'])
+            names = [f"{config['name']}/weight_{i}:0" for i in range(len(weights))]
+            group.attrs['weight_names'] = np.array([name.encode('utf-8') for name in names], dtype='S')
+            for name, weight in zip(names, weights):
+                group.create_dataset(name, data=np.asarray(weight, dtype=np.float32))
+
+
+def is_fused_model(path):
+    try:
+        with h5py.File(path, 'r') as f:
+            return 'fused_from' in f.attrs
+    except OSError:
+        return False
+
+
+def _reference_outputs(source_path, features):
+    try:
+        import tensorflow as tf
+    except ImportError:
+        print("[check_equivalence] : TensorFlow is not installed, so the original is run by numpy_engine as well")
+        return NumpyModel(source_path).predict(features, batch_size=256)
+    return tf.keras.models.load_model(source_path, compile=False).predict(features, batch_size=256, verbose=0)
+
+
+def check_equivalence(source_path, fused_path, features, tolerance=FUSE_TOLERANCE):
+    original = _reference_outputs(source_path, features)
+    fused = NumpyModel(fused_path).predict(features, batch_size=256)
+    max_diff = float(np.max(np.abs(original - fused)))
+    flips = int(np.sum((original > 0.5) != (fused > 0.5)))
+    print(f"[check_equivalence] : {len(features)} samples, max |original - fused| = {max_diff:.2e}, {flips} label flips")
+    if max_diff > tolerance:
+        raise ValueError(f"Fused model differs from {source_path} by {max_diff:.2e} (tolerance {tolerance:.0e})")
+    return max_diff, flips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold BatchNormalization and strip Dropout from a trained model.')
+    parser.add_argument('model', help='Full-model .h5 or .keras file to fuse')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the fused .h5')
+    parser.add_argument('--features', help='Held-out feature set (.npy, shape (N, frames, dims)) for the equivalence check')
+    parser.add_argument('--tolerance', type=float, default=FUSE_TOLERANCE, help='Largest allowed output difference')
+    args = parser.parse_args()
+
+    input_shape, specs = read_model(args.model)
+    fused, folded, kept, dropped = fuse_layers(specs, input_rank=len(input_shape))
+    save_fused_model(args.output, fused, input_shape, _source_keras_version(args.model), args.model)
+    print(f"[main] : {len(specs)} -> {len(fused)} layers: folded {folded} BatchNormalization, kept {kept}, dropped {dropped} Dropout")
+
+    if args.features:
+        features = np.load(args.features).astype(np.float32)
+    else:
+        print("[main] : No --features given, checking on random inputs")
+        features = np.random.default_rng(0).standard_normal((256,) + tuple(input_shape[1:])).astype(np.float32)
+    check_equivalence(args.model, args.output, features, args.tolerance)
+    print(f"[main] : Fused model written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#inference_queue.py
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+import numpy as np
+
+from deadline import DeadlineExceeded
+
+
+class InferenceQueue:
+    """Gather feature tensors from concurrent requests and run them through the model in batches."""
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=10.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches_run = 0
+        self.samples_run = 0
+        self.dropped = 0
+        self._requests = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="inference-queue", daemon=True)
+        self._worker.start()
+
+    def submit(self, features, deadline=None):
+        """Queue a single sample (no batch dimension) and return a Future for its prediction.
+
+        Samples whose deadline has passed by the time their batch is collected are dropped.
+        """
+        future = Future()
+        self._requests.put((np.asarray(features, dtype=np.float32), future, deadline))
+        return future
+
+    def predict(self, features, timeout=None):
+        return self.submit(features).result(timeout=timeout)
+
+    def settings(self):
+        with self._stats_lock:
+            batches_run = self.batches_run
+            samples_run = self.samples_run
+            dropped = self.dropped
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queued": self._requests.qsize(),
+            "batches_run": batches_run,
+            "samples_run": samples_run,
+            "mean_batch_size": samples_run / batches_run if batches_run else 0.0,
+            "dropped": dropped,
+        }
+
+    def _collect_batch(self):
+        # Block for the first request, then keep gathering until the batch is full or the wait runs out
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Requests can only share a predict call when their tensors have the same shape
+            groups = {}
+            for features, future, deadline in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if deadline is not None and deadline.expired():
+                    future.set_exception(DeadlineExceeded("Request deadline passed while queued for inference"))
+                    with self._stats_lock:
+                        self.dropped += 1
+                    continue
+                groups.setdefault(features.shape, []).append((features, future))
+
+            for shape, items in groups.items():
+                try:
+                    inputs = np.stack([features for features, _ in items])
+                    predictions = self.model.predict(inputs, verbose=0)
+                    for (_, future), prediction in zip(items, predictions):
+                        future.set_result(prediction)
+                    with self._stats_lock:
+                        self.batches_run += 1
+                        self.samples_run += len(items)
+                    print(f"[InferenceQueue] : Ran batch of {len(items)} with shape {shape}")
+                except Exception as e:
+                    print(f"[InferenceQueue] : Error running batch with shape {shape}: {e}")
+                    traceback.print_exc()
+                    for _, future in items:
+                        future.set_exception(e)
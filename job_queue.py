@@ -0,0 +1,263 @@
+#job_queue.py
+#
+# Durable queue for batch uploads that take too long to classify within one HTTP request.
+# submit() writes every file to a spool directory and records the job in SQLite (WAL, like
+# the ResultStore), then returns the job id at once; worker threads claim files one at a
+# time and record each label as soon as it is known, so a job can be polled for partial
+# results. Files are claimed shortest estimated audio first with aging (scheduling.py), so
+# a batch of long recordings does not hold up the short clips submitted after it; each
+# file's status includes how long it waited. A claimed file holds a lease, renewed every
+# JOB_LEASE_RENEW_SECONDS for as long as its worker is on it, however long it waits for
+# admission or takes to classify; if the process dies mid-file, the lease runs out and
+# any worker (in this or the next server process) picks the file up again, up to
+# JOB_MAX_ATTEMPTS times. Finished jobs are deleted
+# JOB_RETENTION_SECONDS after they end.
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from audio_decode import estimate_audio_seconds
+from scheduling import SJF_WEIGHT, WaitStats
+
+# Global Variables
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', 'jobs.db')
+JOB_SPOOL_DIR = os.environ.get('JOB_SPOOL_DIR', 'job_spool')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', '86400'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_LEASE_RENEW_SECONDS = JOB_LEASE_SECONDS / 3
+JOB_POLL_SECONDS = 1.0
+JOB_CLEANUP_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    spool_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    label TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    finished_at REAL,
+    audio_seconds REAL NOT NULL DEFAULT 0,
+    queued_at REAL,
+    started_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_job_files_status ON job_files (status, id);
+CREATE INDEX IF NOT EXISTS idx_job_files_job ON job_files (job_id, position);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at);
+"""
+
+
+class JobQueue:
+    """SQLite-backed job queue with a spool directory for the uploads and a pool of worker threads."""
+
+    def __init__(self, process, db_path=JOBS_DB_PATH, spool_dir=JOB_SPOOL_DIR, num_workers=JOB_WORKERS,
+                 retention_seconds=JOB_RETENTION_SECONDS):
+        self.process = process  # (audio bytes, filename) -> label
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.num_workers = num_workers
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._leased = set()  # job_files ids this process is working on
+        self._leased_lock = threading.Lock()
+        self.waits = WaitStats()
+        os.makedirs(spool_dir, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+        for index in range(num_workers):
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True).start()
+        threading.Thread(target=self._clean_up, name="job-cleanup", daemon=True).start()
+        threading.Thread(target=self._renew_leases, name="job-lease", daemon=True).start()
+        print(f"[JobQueue] : Started {num_workers} job workers on {db_path}")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def submit(self, uploads):
+        """Spool [(filename, audio bytes), ...] as one job and return its id; processing happens in the background."""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir)
+        created_at = time.time()
+        rows = []
+        for position, (filename, audio_bytes) in enumerate(uploads):
+            spool_path = os.path.join(job_dir, str(position))
+            with open(spool_path, 'wb') as f:
+                f.write(audio_bytes)
+            rows.append((job_id, position, filename, spool_path, 'queued', estimate_audio_seconds(audio_bytes), created_at))
+        with self._connection() as conn:
+            conn.execute('INSERT INTO jobs (id, created_at) VALUES (?, ?)', (job_id, created_at))
+            conn.executemany('INSERT INTO job_files (job_id, position, filename, spool_path, status, audio_seconds, queued_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id):
+        """Job summary with per-file status and labels so far, or None for an unknown or expired job."""
+        conn = self._connection()
+        job = conn.execute('SELECT created_at, finished_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None:
+            return None
+        files = [{
+            "filename": row["filename"],
+            "status": row["status"],
+            "prediction": row["label"],
+            "error": row["error"],
+            "audio_seconds": row["audio_seconds"],
+            "queue_wait": row["started_at"] - row["queued_at"] if row["started_at"] is not None and row["queued_at"] is not None else None,
+        } for row in conn.execute(
+            'SELECT filename, status, label, error, audio_seconds, queued_at, started_at FROM job_files '
+            'WHERE job_id = ? ORDER BY position', (job_id,))]
+        done = sum(1 for f in files if f["status"] == 'done')
+        failed = sum(1 for f in files if f["status"] == 'failed')
+        if job["finished_at"] is not None:
+            status = 'finished'
+        elif any(f["status"] != 'queued' for f in files):
+            status = 'running'
+        else:
+            status = 'queued'
+        return {
+            "job_id": job_id,
+            "status": status,
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "expires_at": job["finished_at"] + self.retention_seconds if job["finished_at"] is not None else None,
+            "total": len(files),
+            "done": done,
+            "failed": failed,
+            "files": files,
+        }
+
+    def stats(self):
+        counts = dict(self._connection().execute('SELECT status, COUNT(*) FROM job_files GROUP BY status').fetchall())
+        return {"workers": self.num_workers, "retention_seconds": self.retention_seconds, "files": counts,
+                "queue_wait": self.waits.summary()}
+
+    def _claim(self):
+        # BEGIN IMMEDIATE takes the write lock, so two workers (or processes) never claim the same file
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Files whose worker died go first; the rest by queued_at + SJF_WEIGHT * audio_seconds
+            row = conn.execute(
+                "SELECT id, job_id, filename, spool_path, attempts, audio_seconds, queued_at, started_at FROM job_files "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY status = 'queued', COALESCE(queued_at, 0) + ? * audio_seconds, id LIMIT 1", (now, SJF_WEIGHT)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                # Every earlier attempt died with its worker; stop retrying this file
+                self._finish(conn, row, 'failed', error=f"Abandoned after {row['attempts']} attempts")
+                conn.commit()
+                return self._claim()
+            conn.execute("UPDATE job_files SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                         "started_at = COALESCE(started_at, ?) WHERE id = ?", (now + JOB_LEASE_SECONDS, now, row["id"]))
+            conn.commit()
+            if row["started_at"] is None and row["queued_at"] is not None:
+                self.waits.record(row["audio_seconds"], now - row["queued_at"])
+            return row
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _finish(self, conn, row, status, label=None, error=None):
+        now = time.time()
+        conn.execute('UPDATE job_files SET status = ?, label = ?, error = ?, lease_until = NULL, finished_at = ? WHERE id = ?',
+                     (status, label, error, now, row["id"]))
+        conn.execute("UPDATE jobs SET finished_at = ? WHERE id = ? AND NOT EXISTS "
+                     "(SELECT 1 FROM job_files WHERE job_id = ? AND status IN ('queued', 'running'))",
+                     (now, row["job_id"], row["job_id"]))
+        try:
+            os.remove(row["spool_path"])
+        except FileNotFoundError:
+            pass
+
+    def _work(self):
+        while True:
+            try:
+                row = self._claim()
+            except Exception as e:
+                print(f"[JobQueue] : Error claiming a job file: {e}")
+                traceback.print_exc()
+                row = None
+            if row is None:
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+
+            with self._leased_lock:
+                self._leased.add(row["id"])
+            try:
+                try:
+                    with open(row["spool_path"], 'rb') as f:
+                        audio_bytes = f.read()
+                    label = self.process(audio_bytes, row["filename"])
+                    status, error = 'done', None
+                except Exception as e:
+                    print(f"[JobQueue] : Error processing {row['filename']} of job {row['job_id']}: {e}")
+                    traceback.print_exc()
+                    label, status, error = None, 'failed', str(e)
+                with self._connection() as conn:
+                    self._finish(conn, row, status, label=label, error=error)
+            finally:
+                with self._leased_lock:
+                    self._leased.discard(row["id"])
+
+    def _renew_leases(self):
+        # Keeps the files this process is still working on from being claimed again by another worker
+        while True:
+            time.sleep(JOB_LEASE_RENEW_SECONDS)
+            with self._leased_lock:
+                leased = list(self._leased)
+            if not leased:
+                continue
+            try:
+                with self._connection() as conn:
+                    conn.executemany("UPDATE job_files SET lease_until = ? WHERE id = ? AND status = 'running'",
+                                     [(time.time() + JOB_LEASE_SECONDS, file_id) for file_id in leased])
+            except Exception as e:
+                print(f"[JobQueue] : Error renewing job file leases: {e}")
+                traceback.print_exc()
+
+    def _clean_up(self):
+        while True:
+            time.sleep(JOB_CLEANUP_INTERVAL)
+            try:
+                cutoff = time.time() - self.retention_seconds
+                with self._connection() as conn:
+                    expired = [row[0] for row in conn.execute('SELECT id FROM jobs WHERE finished_at < ?', (cutoff,))]
+                    for job_id in expired:
+                        conn.execute('DELETE FROM job_files WHERE job_id = ?', (job_id,))
+                        conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+                for job_id in expired:
+                    shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+                if expired:
+                    print(f"[JobQueue] : Removed {len(expired)} jobs finished more than {self.retention_seconds:.0f}s ago")
+            except Exception as e:
+                print(f"[JobQueue] : Error removing expired jobs: {e}")
+                traceback.print_exc()
@@ -0,0 +1,130 @@
+#live_scoring.py
+#
+# Scores audio while it is still being recorded. A LiveSession takes raw PCM (or Opus
+# packets, when PyAV is installed) in whatever chunks the client sends, resamples it as a
+# stream, and feeds two things as it arrives:
+#   - a StreamingFeatures extractor over the whole utterance, whose partial result gives
+#     the rolling score and whose final result is the same feature vector /process_audio
+#     computes for the complete clip, so the verdict only waits for the last chunk;
+#   - a WindowRing of the last LIVE_WINDOW_SECONDS, scored every LIVE_UPDATE_SECONDS, so
+#     a synthetic stretch in the middle of a long recording shows up on its own.
+import os
+import time
+
+import numpy as np
+import soxr
+
+from audio_decode import RESAMPLE_QUALITY, av
+from audio_stream import WindowRing
+from feature_engine import N_FFT, compute_custom_features
+from streaming_features import StreamingFeatures, candidate_chroma_bases
+
+# Global Variables
+LIVE_UPDATE_SECONDS = float(os.environ.get('LIVE_UPDATE_SECONDS', '1'))
+LIVE_WINDOW_SECONDS = float(os.environ.get('LIVE_WINDOW_SECONDS', '5'))
+PCM_ENCODINGS = {
+    's16le': ('<i2', 1.0 / 32768),
+    'f32le': ('<f4', 1.0),
+}
+OPUS_SAMPLE_RATE = 48000
+LABELS = ['FAKE', 'REAL']
+
+
+def warm_up(target_sr):
+    """Build the per-tuning chroma filterbanks (a few seconds) before the first live session needs them."""
+    candidate_chroma_bases(target_sr, N_FFT)
+
+
+class OpusDecoder:
+    """Decodes individual Opus packets (one per WebSocket message) to mono float32 at 48 kHz."""
+
+    def __init__(self):
+        if av is None:
+            raise ImportError("Opus input needs PyAV (pip install av)")
+        self.codec = av.CodecContext.create('opus', 'r')
+        self.resampler = av.AudioResampler(format='flt', layout='mono', rate=OPUS_SAMPLE_RATE)
+
+    def decode(self, packet):
+        chunks = [resampled.to_ndarray()[0]
+                  for frame in self.codec.decode(av.Packet(packet))
+                  for resampled in self.resampler.resample(frame)]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+
+class LiveSession:
+    """One live recording: feed() chunks as they arrive, finish() for the verdict."""
+
+    def __init__(self, predict, target_sr, sample_rate=16000, encoding='s16le', channels=1):
+        if encoding != 'opus' and encoding not in PCM_ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding!r}; expected one of {sorted(PCM_ENCODINGS) + ['opus']}")
+        self.predict = predict
+        self.target_sr = target_sr
+        self.encoding = encoding
+        self.channels = channels
+        self.opus = OpusDecoder() if encoding == 'opus' else None
+        self.sample_rate = OPUS_SAMPLE_RATE if self.opus else sample_rate
+        self.resampler = None
+        if self.sample_rate != target_sr:
+            self.resampler = soxr.ResampleStream(self.sample_rate, target_sr, 1, dtype='float32', quality=RESAMPLE_QUALITY)
+        self.features = StreamingFeatures(sr=target_sr)
+        self.update_samples = int(LIVE_UPDATE_SECONDS * target_sr)
+        self.windows = WindowRing(int(LIVE_WINDOW_SECONDS * target_sr), self.update_samples)
+        self.samples = 0
+        self._next_update = self.update_samples
+        self._partial = b''
+
+    def _decode(self, data):
+        if self.opus:
+            return self.opus.decode(data)
+        dtype, scale = PCM_ENCODINGS[self.encoding]
+        # Chunk boundaries need not fall on sample boundaries
+        data = self._partial + bytes(data)
+        frame_bytes = np.dtype(dtype).itemsize * self.channels
+        usable = len(data) - len(data) % frame_bytes
+        self._partial = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=dtype).astype(np.float32) * np.float32(scale)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        return samples
+
+    def _score(self, features):
+        score = float(np.asarray(self.predict(features)).ravel()[0])
+        return score, LABELS[int(score > 0.5)]
+
+    def feed(self, data):
+        """Add one chunk; returns the rolling update it completed, if any, as a one-element list."""
+        samples = self._decode(data)
+        if self.resampler:
+            samples = self.resampler.resample_chunk(samples)
+        return self._add(samples)
+
+    def _add(self, samples):
+        self.samples += len(samples)
+        self.features.push(samples)
+        windows = list(self.windows.push(samples))
+        if self.samples < self._next_update:
+            return []
+        self._next_update = (self.samples // self.update_samples + 1) * self.update_samples
+
+        score, label = self._score(self.features.result())
+        update = {"seconds": self.samples / self.target_sr, "score": score, "label": label}
+        if windows:
+            # Only the latest window matters if one chunk completed several
+            update["window_score"], update["window_label"] = self._score(compute_custom_features(windows[-1][2], sr=self.target_sr))
+        return [update]
+
+    def finish(self):
+        """Verdict over the whole utterance, scored the moment the last chunk is in."""
+        end_of_speech = time.monotonic()
+        if self.resampler:
+            self._add(self.resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+        if self.samples == 0:
+            raise ValueError("No audio received")
+        score, label = self._score(self.features.finish().result())
+        return {
+            "final": True,
+            "seconds": self.samples / self.target_sr,
+            "score": score,
+            "label": label,
+            "verdict_ms": (time.monotonic() - end_of_speech) * 1000,
+        }
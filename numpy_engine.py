@@ -0,0 +1,367 @@
+#numpy_engine.py
+#
+# TensorFlow-free forward pass for the Sequential Conv1D / BiGRU classifiers. The layer
+# stack and weights are read straight from the saved model (full-model .h5 or .keras
+# archive) with h5py, converted once to contiguous float32 arrays, and run with
+# vectorized NumPy kernels: convolutions as one matmul per kernel tap, BatchNormalization
+# as a precomputed scale/shift, Dropout as the identity, and recurrent layers with the
+# input projection for every timestep hoisted out of the time loop.
+import io
+import json
+import re
+import zipfile
+
+import h5py
+import numpy as np
+
+
+def _sigmoid(x):
+    # Same as 1 / (1 + exp(-x)) without overflow warnings for large negative inputs
+    return 0.5 * np.tanh(0.5 * x) + 0.5
+
+
+def _softmax(x):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    None: lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'softmax': _softmax,
+}
+
+
+def _activation(name):
+    if isinstance(name, dict):
+        name = name.get('config', {}).get('name', name.get('class_name'))
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation {name!r}")
+    return ACTIVATIONS[name]
+
+
+def _contiguous(array):
+    return np.ascontiguousarray(array, dtype=np.float32)
+
+
+def _single(value):
+    return value[0] if isinstance(value, (list, tuple)) else value
+
+
+class _Conv1D:
+    def __init__(self, config, weights):
+        self.kernel = _contiguous(weights[0])  # (taps, in, out)
+        self.bias = _contiguous(weights[1]) if config.get('use_bias', True) else None
+        self.stride = _single(config.get('strides', 1))
+        self.dilation = _single(config.get('dilation_rate', 1))
+        self.padding = config.get('padding', 'valid')
+        self.activation = _activation(config.get('activation'))
+
+    def __call__(self, x):
+        taps = self.kernel.shape[0]
+        span = self.dilation * (taps - 1)
+        if self.padding == 'same':
+            x = np.pad(x, ((0, 0), (span // 2, span - span // 2), (0, 0)))
+        elif self.padding == 'causal':
+            x = np.pad(x, ((0, 0), (span, 0), (0, 0)))
+        steps = (x.shape[1] - span - 1) // self.stride + 1
+        out = None
+        for tap in range(taps):
+            start = tap * self.dilation
+            term = x[:, start:start + (steps - 1) * self.stride + 1:self.stride] @ self.kernel[tap]
+            out = term if out is None else out + term
+        if self.bias is not None:
+            out += self.bias
+        return self.activation(out)
+
+
+class _BatchNormalization:
+    def __init__(self, config, weights):
+        weights = list(weights)
+        gamma = weights.pop(0) if config.get('scale', True) else 1.0
+        beta = weights.pop(0) if config.get('center', True) else 0.0
+        mean, variance = weights
+        self.axis = config.get('axis', -1)
+        self.scale = _contiguous(gamma / np.sqrt(variance + config.get('epsilon', 1e-3)))
+        self.shift = _contiguous(beta - mean * self.scale)
+
+    def __call__(self, x):
+        for axis in np.atleast_1d(self.axis):
+            if axis % x.ndim != x.ndim - 1:
+                raise ValueError(f"BatchNormalization over axis {axis} of a {x.ndim}-D input is not supported")
+        return x * self.scale + self.shift
+
+
+class _MaxPooling1D:
+    def __init__(self, config, weights):
+        self.pool = _single(config.get('pool_size', 2))
+        self.stride = _single(config.get('strides') or self.pool)
+        if config.get('padding', 'valid') != 'valid':
+            raise ValueError("Only 'valid' MaxPooling1D padding is supported")
+
+    def __call__(self, x):
+        if self.pool == 1 and self.stride == 1:
+            return x
+        steps = (x.shape[1] - self.pool) // self.stride + 1
+        end = (steps - 1) * self.stride + 1
+        out = x[:, 0:end:self.stride]
+        for offset in range(1, self.pool):
+            out = np.maximum(out, x[:, offset:offset + end:self.stride])
+        return out
+
+
+class _GRU:
+    def __init__(self, config, weights):
+        self.kernel = _contiguous(weights[0])  # (in, 3 units), gates z, r, h
+        self.recurrent_kernel = _contiguous(weights[1])
+        self.units = self.recurrent_kernel.shape[0]
+        self.reset_after = config.get('reset_after', True)
+        bias = weights[2] if config.get('use_bias', True) else np.zeros((2, 3 * self.units) if self.reset_after else 3 * self.units)
+        if self.reset_after:
+            self.input_bias, self.recurrent_bias = _contiguous(bias[0]), _contiguous(bias[1])
+        else:
+            self.input_bias, self.recurrent_bias = _contiguous(bias), None
+        self.activation = _activation(config.get('activation', 'tanh'))
+        self.recurrent_activation = _activation(config.get('recurrent_activation', 'sigmoid'))
+        self.return_sequences = config.get('return_sequences', False)
+        self.go_backwards = config.get('go_backwards', False)
+
+    def __call__(self, x):
+        batch, steps, _ = x.shape
+        u = self.units
+        projected = x @ self.kernel + self.input_bias
+        h = np.zeros((batch, u), dtype=np.float32)
+        outputs = np.empty((batch, steps, u), dtype=np.float32) if self.return_sequences else None
+        order = range(steps - 1, -1, -1) if self.go_backwards else range(steps)
+        for index, t in enumerate(order):
+            xz, xr, xh = projected[:, t, :u], projected[:, t, u:2 * u], projected[:, t, 2 * u:]
+            if self.reset_after:
+                hp = h @ self.recurrent_kernel + self.recurrent_bias
+                z = self.recurrent_activation(xz + hp[:, :u])
+                r = self.recurrent_activation(xr + hp[:, u:2 * u])
+                candidate = self.activation(xh + r * hp[:, 2 * u:])
+            else:
+                hp = h @ self.recurrent_kernel[:, :2 * u]
+                z = self.recurrent_activation(xz + hp[:, :u])
+                r = self.recurrent_activation(xr + hp[:, u:])
+                candidate = self.activation(xh + (r * h) @ self.recurrent_kernel[:, 2 * u:])
+            h = z * h + (1 - z) * candidate
+            if outputs is not None:
+                outputs[:, index] = h
+        return outputs if outputs is not None else h
+
+
+class _LSTM:
+    def __init__(self, config, weights):
+        self.kernel = _contiguous(weights[0])  # (in, 4 units), gates i, f, c, o
+        self.recurrent_kernel = _contiguous(weights[1])
+        self.units = self.recurrent_kernel.shape[0]
+        self.bias = _contiguous(weights[2]) if config.get('use_bias', True) else np.zeros(4 * self.units, np.float32)
+        self.activation = _activation(config.get('activation', 'tanh'))
+        self.recurrent_activation = _activation(config.get('recurrent_activation', 'sigmoid'))
+        self.return_sequences = config.get('return_sequences', False)
+        self.go_backwards = config.get('go_backwards', False)
+
+    def __call__(self, x):
+        batch, steps, _ = x.shape
+        u = self.units
+        projected = x @ self.kernel + self.bias
+        h = np.zeros((batch, u), dtype=np.float32)
+        c = np.zeros((batch, u), dtype=np.float32)
+        outputs = np.empty((batch, steps, u), dtype=np.float32) if self.return_sequences else None
+        order = range(steps - 1, -1, -1) if self.go_backwards else range(steps)
+        for index, t in enumerate(order):
+            gates = projected[:, t] + h @ self.recurrent_kernel
+            i = self.recurrent_activation(gates[:, :u])
+            f = self.recurrent_activation(gates[:, u:2 * u])
+            o = self.recurrent_activation(gates[:, 3 * u:])
+            c = f * c + i * self.activation(gates[:, 2 * u:3 * u])
+            h = o * self.activation(c)
+            if outputs is not None:
+                outputs[:, index] = h
+        return outputs if outputs is not None else h
+
+
+RECURRENT_LAYERS = {'GRU': _GRU, 'LSTM': _LSTM}
+
+
+class _Bidirectional:
+    def __init__(self, config, weights):
+        inner = config['layer']
+        forward_config = dict(inner['config'])
+        backward_config = dict(config['backward_layer']['config']) if config.get('backward_layer') else \
+            dict(forward_config, go_backwards=not forward_config.get('go_backwards', False))
+        layer_class = RECURRENT_LAYERS[inner['class_name']]
+        half = len(weights) // 2
+        self.forward = layer_class(forward_config, weights[:half])
+        self.backward = layer_class(backward_config, weights[half:])
+        self.merge_mode = config.get('merge_mode', 'concat')
+
+    def __call__(self, x):
+        forward, backward = self.forward(x), self.backward(x)
+        if self.backward.return_sequences:
+            backward = backward[:, ::-1]
+        if self.merge_mode == 'concat':
+            return np.concatenate([forward, backward], axis=-1)
+        if self.merge_mode == 'sum':
+            return forward + backward
+        if self.merge_mode == 'mul':
+            return forward * backward
+        if self.merge_mode == 'ave':
+            return (forward + backward) / 2
+        raise ValueError(f"Unsupported Bidirectional merge_mode {self.merge_mode!r}")
+
+
+class _Dense:
+    def __init__(self, config, weights):
+        self.kernel = _contiguous(weights[0])
+        self.bias = _contiguous(weights[1]) if config.get('use_bias', True) else None
+        self.activation = _activation(config.get('activation'))
+
+    def __call__(self, x):
+        out = x @ self.kernel
+        if self.bias is not None:
+            out += self.bias
+        return self.activation(out)
+
+
+class _Lambda:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, x):
+        return self.fn(x)
+
+
+LAYERS = {
+    'Conv1D': _Conv1D,
+    'BatchNormalization': _BatchNormalization,
+    'MaxPooling1D': _MaxPooling1D,
+    'GRU': _GRU,
+    'LSTM': _LSTM,
+    'Bidirectional': _Bidirectional,
+    'Dense': _Dense,
+    'Dropout': lambda config, weights: None,
+    'SpatialDropout1D': lambda config, weights: None,
+    'GaussianNoise': lambda config, weights: None,
+    'Flatten': lambda config, weights: _Lambda(lambda x: x.reshape(len(x), -1)),
+    'GlobalMaxPooling1D': lambda config, weights: _Lambda(lambda x: x.max(axis=1)),
+    'GlobalAveragePooling1D': lambda config, weights: _Lambda(lambda x: x.mean(axis=1)),
+    'Activation': lambda config, weights: _Lambda(_activation(config.get('activation'))),
+}
+
+
+def _snake_case(name):
+    name = re.sub(r'(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub(r'([a-z])([A-Z])', r'\1_\2', name).lower()
+
+
+def _sequential_layers(model_config):
+    if model_config.get('class_name') != 'Sequential':
+        raise ValueError(f"Only Sequential models are supported, got {model_config.get('class_name')}")
+    config = model_config['config']
+    return config['layers'] if isinstance(config, dict) else config
+
+
+def _read_legacy_h5(f):
+    """Full-model .h5 written by model.save(): config in an attribute, weights under model_weights/<layer>."""
+    raw_config = f.attrs.get('model_config')
+    if raw_config is None:
+        raise ValueError("The .h5 file holds weights only; save the full model (model.save) to load it without TensorFlow")
+    if isinstance(raw_config, bytes):
+        raw_config = raw_config.decode('utf-8')
+    layers = _sequential_layers(json.loads(raw_config))
+    weights_group = f['model_weights'] if 'model_weights' in f else f
+    specs = []
+    for layer in layers:
+        name = layer['config'].get('name')
+        weights = []
+        if name in weights_group:
+            group = weights_group[name]
+            names = [n.decode('utf-8') if isinstance(n, bytes) else n for n in group.attrs.get('weight_names', [])]
+            weights = [group[n][()] for n in names]
+        specs.append((layer['class_name'], layer['config'], weights))
+    return layers, specs
+
+
+def _read_keras_archive(path):
+    """.keras archive: config.json plus model.weights.h5 keyed by snake_case class name and per-class index."""
+    with zipfile.ZipFile(path) as archive:
+        layers = _sequential_layers(json.loads(archive.read('config.json')))
+        weights_file = h5py.File(io.BytesIO(archive.read('model.weights.h5')), 'r')
+    seen = {}
+    specs = []
+    with weights_file:
+        for layer in layers:
+            base = _snake_case(layer['class_name'])
+            index = seen.get(base, 0)
+            seen[base] = index + 1
+            key = f"layers/{base}" + (f"_{index}" if index else '')
+            weights = []
+            if key in weights_file:
+                group = weights_file[key]
+                if layer['class_name'] == 'Bidirectional':
+                    for direction in ('forward_layer', 'backward_layer'):
+                        weights.extend(_numbered_vars(group[direction]['cell']['vars']))
+                elif 'cell' in group:
+                    weights = _numbered_vars(group['cell']['vars'])
+                elif 'vars' in group:
+                    weights = _numbered_vars(group['vars'])
+            specs.append((layer['class_name'], layer['config'], weights))
+    return layers, specs
+
+
+def _numbered_vars(group):
+    return [group[str(i)][()] for i in range(len(group))]
+
+
+def _input_shape(layers):
+    for layer in layers:
+        config = layer['config']
+        shape = config.get('batch_input_shape') or config.get('batch_shape')
+        if shape:
+            return tuple(shape)
+    build_config = layers[0].get('build_config', {}) if layers else {}
+    return tuple(build_config['input_shape']) if 'input_shape' in build_config else None
+
+
+def read_model(path):
+    """Return (input_shape, [(class_name, config, [weight arrays])]) for a saved Sequential model."""
+    if zipfile.is_zipfile(path):
+        layers, specs = _read_keras_archive(path)
+    else:
+        with h5py.File(path, 'r') as f:
+            layers, specs = _read_legacy_h5(f)
+    return _input_shape(layers), [spec for spec in specs if spec[0] != 'InputLayer']
+
+
+class NumpyModel:
+    """Inference-only replacement for a loaded Keras model: model.predict(x) without TensorFlow."""
+
+    def __init__(self, path):
+        self.path = path
+        self.input_shape, specs = read_model(path)
+        self.layers = []
+        for class_name, config, weights in specs:
+            if class_name not in LAYERS:
+                raise ValueError(f"Layer {class_name} ({config.get('name')}) is not supported by the NumPy engine")
+            layer = LAYERS[class_name](config, weights)
+            if layer is not None:
+                self.layers.append(layer)
+        self.weight_bytes = sum(array.nbytes for _, _, weights in specs for array in weights)
+        print(f"[NumpyModel] : Loaded {len(self.layers)} layers ({self.weight_bytes / 1e6:.1f} MB of weights) from {path}")
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if not batch_size or len(x) <= batch_size:
+            return self(x)
+        return np.concatenate([self(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
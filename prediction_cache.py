@@ -0,0 +1,94 @@
+#prediction_cache.py
+#
+# Bounded LRU + TTL cache of predictions keyed by the hash of the raw upload bytes, the
+# model version and the feature configuration. The model version is a fingerprint of the
+# weights file, so replacing bestbigru.h5 on disk drops every cached prediction.
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Global Variables
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '1024'))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+
+
+def model_fingerprint(model_path):
+    stat = os.stat(model_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL map of (audio hash, model version, feature config) -> prediction."""
+
+    def __init__(self, model_path, feature_config, max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL):
+        self.model_path = model_path
+        self.feature_config = feature_config
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = model_fingerprint(model_path)
+
+    def _check_model_version(self):
+        # Called with the lock held
+        try:
+            version = model_fingerprint(self.model_path)
+        except OSError:
+            return self._model_version
+        if version != self._model_version:
+            print(f"[PredictionCache] : {self.model_path} changed, dropping {len(self._entries)} cached predictions")
+            self._entries.clear()
+            self._model_version = version
+            self.invalidations += 1
+        return version
+
+    def key(self, audio_bytes):
+        with self._lock:
+            model_version = self._check_model_version()
+        return (hashlib.sha256(audio_bytes).hexdigest(), model_version, self.feature_config)
+
+    def get(self, key):
+        with self._lock:
+            self._check_model_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            # A prediction computed against an older model version must not be stored
+            if key[1] != self._check_model_version():
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "model_version": self._model_version,
+            }
@@ -0,0 +1,110 @@
+#result_store.py
+#
+# Append-only store for classification results backed by SQLite in WAL mode. Each insert
+# only appends rows, several server processes can write at once, and reads are paged
+# through indexes on filename, timestamp and label instead of loading the whole history.
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+# Global Variables
+RESULTS_DB_PATH = os.environ.get('RESULTS_DB_PATH', 'results.db')
+LEGACY_RESULTS_PATH = 'results.json'
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    label TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_filename ON results (filename);
+CREATE INDEX IF NOT EXISTS idx_results_created_at ON results (created_at);
+CREATE INDEX IF NOT EXISTS idx_results_label ON results (label);
+"""
+
+
+class ResultStore:
+    """SQLite result store with one connection per thread."""
+
+    def __init__(self, db_path=RESULTS_DB_PATH, legacy_path=LEGACY_RESULTS_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+        if legacy_path and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy(self, legacy_path):
+        # One-off migration of the old results.json history; the write lock keeps concurrent workers from importing twice
+        try:
+            with open(legacy_path, 'r') as f:
+                legacy = json.load(f)
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] > 0:
+                    conn.rollback()
+                    return
+                conn.executemany('INSERT INTO results (filename, label, created_at) VALUES (?, ?, 0)',
+                                 [(audio["filename"], audio["prediction"]) for audio in legacy])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"[ResultStore] : Imported {len(legacy)} results from {legacy_path}")
+        except Exception as e:
+            print(f"[ResultStore] : Error importing {legacy_path}: {e}")
+            traceback.print_exc()
+
+    def append(self, audios):
+        created_at = time.time()
+        rows = [(audio["filename"], audio["prediction"], created_at) for audio in audios]
+        with self._connection() as conn:
+            conn.executemany('INSERT INTO results (filename, label, created_at) VALUES (?, ?, ?)', rows)
+        return len(rows)
+
+    @staticmethod
+    def _where(filename=None, label=None, since=None, until=None):
+        clauses, params = [], []
+        if filename is not None:
+            clauses.append('filename = ?')
+            params.append(filename)
+        if label is not None:
+            clauses.append('label = ?')
+            params.append(label)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._connection().execute(f'SELECT COUNT(*) FROM results{where}', params).fetchone()[0]
+
+    def query(self, limit=100, offset=0, descending=False, **filters):
+        where, params = self._where(**filters)
+        order = 'DESC' if descending else 'ASC'
+        limit = max(0, min(int(limit), MAX_PAGE_SIZE))
+        rows = self._connection().execute(
+            f'SELECT filename, label, created_at FROM results{where} ORDER BY id {order} LIMIT ? OFFSET ?',
+            params + [limit, max(0, int(offset))],
+        ).fetchall()
+        return [{"filename": row["filename"], "prediction": row["label"], "timestamp": row["created_at"]} for row in rows]
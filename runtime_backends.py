@@ -0,0 +1,100 @@
+#runtime_backends.py
+#
+# Inference runtimes the server can switch between with MODEL_BACKEND. Every backend
+# exposes the slice of the Keras model API the serving code uses (input_shape and
+# predict(x, verbose=0)), so InferenceQueue runs any of them unchanged:
+#   numpy    numpy_engine.NumpyModel on a full-model .h5 / .keras file
+#   tflite   .tflite files written by export_runtime.py
+#   onnx     .onnx files written by export_runtime.py, run with onnxruntime
+# None of them import TensorFlow, except tflite when neither the standalone LiteRT nor
+# tflite_runtime interpreter is installed.
+import os
+import threading
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Global Variables
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', '0'))  # 0 lets the runtime decide
+
+
+def _tflite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """TFLite classifier exported with a batch of one; batches are run sample by sample."""
+
+    def __init__(self, path, num_threads=INFERENCE_THREADS):
+        self.path = path
+        self.interpreter = _tflite_interpreter_class()(model_path=path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input['shape'][1:])
+        # One interpreter holds one set of tensors, so concurrent callers take turns
+        self._lock = threading.Lock()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        outputs = []
+        with self._lock:
+            for sample in x:
+                self.interpreter.set_tensor(self._input['index'], sample[np.newaxis])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self._output['index']).copy())
+        return np.concatenate(outputs)
+
+
+class OnnxModel:
+    """ONNX classifier run with onnxruntime on the CPU execution provider."""
+
+    def __init__(self, path, num_threads=INFERENCE_THREADS):
+        if ort is None:
+            raise ImportError("The onnx backend needs onnxruntime (pip install onnxruntime)")
+        self.path = path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.input_shape = tuple(d if isinstance(d, int) else None for d in model_input.shape)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.session.run(None, {self._input_name: np.asarray(x, dtype=np.float32)})[0]
+
+
+def _numpy_model(path, num_threads=INFERENCE_THREADS):
+    from numpy_engine import NumpyModel
+    return NumpyModel(path)
+
+
+BACKENDS = {
+    'numpy': _numpy_model,
+    'tflite': TFLiteModel,
+    'onnx': OnnxModel,
+}
+
+
+def load_backend(backend, path, num_threads=INFERENCE_THREADS):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {sorted(BACKENDS)} or 'keras'")
+    model = BACKENDS[backend](path, num_threads=num_threads)
+    print(f"[load_backend] : Loaded {path} with the {backend} backend")
+    return model
@@ -0,0 +1,52 @@
+#scheduling.py
+#
+# Weighted shortest-job-first with aging for the queues in front of the decoder pool, the
+# feature pool and the job workers. Work is ordered by
+#     queued_at + SJF_WEIGHT * audio_seconds
+# so a clip that is shorter by d seconds goes ahead of anything queued less than
+# SJF_WEIGHT * d seconds before it. Equivalently, every job ages at one second of priority
+# per second waited, and no job waits more than SJF_WEIGHT * its own length behind work
+# that arrived after it. The key never changes once a job is queued, so a plain heap (or
+# an ORDER BY) keeps the schedule.
+#
+# WaitStats keeps the recent queue waits per clip-length bucket, to compare the wait of
+# short clips with that of long files.
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+# Global Variables
+SJF_WEIGHT = float(os.environ.get('SJF_WEIGHT', '0.5'))  # seconds of queue priority per second of audio
+WAIT_BUCKETS = ((10.0, 'short (<10s)'), (60.0, 'medium (10-60s)'), (float('inf'), 'long (>=60s)'))
+WAIT_HISTORY = 1000
+
+
+def sjf_key(audio_seconds, queued_at, weight=SJF_WEIGHT):
+    return queued_at + weight * audio_seconds
+
+
+class WaitStats:
+    """Recent queue waits, summarized as p50/p95 per clip-length bucket."""
+
+    def __init__(self, history=WAIT_HISTORY):
+        self._waits = {label: deque(maxlen=history) for _, label in WAIT_BUCKETS}
+        self._lock = threading.Lock()
+
+    def record(self, audio_seconds, wait_seconds):
+        label = next(label for limit, label in WAIT_BUCKETS if audio_seconds < limit)
+        with self._lock:
+            self._waits[label].append(wait_seconds)
+
+    def summary(self):
+        with self._lock:
+            waits = {label: np.array(values) for label, values in self._waits.items()}
+        return {
+            label: {
+                "count": len(values),
+                "p50_wait_ms": float(np.percentile(values, 50) * 1000) if len(values) else None,
+                "p95_wait_ms": float(np.percentile(values, 95) * 1000) if len(values) else None,
+            }
+            for label, values in waits.items()
+        }
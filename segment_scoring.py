@@ -0,0 +1,101 @@
+#segment_scoring.py
+#
+# Scores a recording of any length as a run of fixed-length, optionally overlapping
+# segments. Every segment is scored (the last one zero-padded) instead of truncating to a
+# fixed segment count, and segments are featurized and predicted SEGMENT_BATCH at a time,
+# so only one batch of segment waveforms and features is held at once whatever the length
+# of the file. The result carries the per-segment scores as well as the aggregate.
+#
+# stream_segments does the same over a stream of sample blocks (audio_stream.py) and yields
+# each segment as soon as its batch is predicted; score_file uses it to score a file
+# without ever decoding it whole. A streamed file cannot be peak-normalized up front, so
+# each window is normalized on its own and windows below SILENCE_PEAK are left unscored.
+import os
+
+import numpy as np
+
+from audio_stream import WindowRing, stream_audio_blocks
+
+# Global Variables
+SEGMENT_OVERLAP = float(os.environ.get('SEGMENT_OVERLAP', '0'))  # fraction of a segment shared with the next
+SEGMENT_BATCH = int(os.environ.get('SEGMENT_BATCH', '32'))
+SILENCE_PEAK = 0.01
+DECISION_THRESHOLD = 0.5
+LABELS = ['FAKE', 'REAL']
+
+
+def segment_hop(segment_len, overlap=SEGMENT_OVERLAP):
+    if not 0 <= overlap < 1:
+        raise ValueError(f"Segment overlap must be in [0, 1), got {overlap}")
+    return max(1, int(round(segment_len * (1 - overlap))))
+
+
+def _score_batch(batch, sr, featurize, predict, with_features):
+    windows = [window for _, _, window in batch if window is not None]
+    scores, inputs = iter(()), None
+    if windows:
+        inputs = featurize(np.stack(windows))
+        scores = iter(np.asarray(predict(inputs)).ravel().tolist())
+    index = 0
+    for start, end, window in batch:
+        segment = {"start": start / sr, "end": end / sr, "score": None if window is None else next(scores)}
+        if with_features and window is not None:
+            segment["features"] = [x[index] for x in inputs] if isinstance(inputs, list) else inputs[index]
+            index += 1
+        yield segment
+
+
+def stream_segments(blocks, sr, featurize, predict, segment_seconds, overlap=SEGMENT_OVERLAP,
+                    batch_segments=SEGMENT_BATCH, normalize=True, with_features=False):
+    """Yield {"start", "end", "score"} for every segment of a stream of sample blocks, one batch at a time.
+
+    featurize maps a (n, segment samples) batch to model inputs and predict maps those to scores.
+    """
+    segment_len = int(segment_seconds * sr)
+    ring = WindowRing(segment_len, segment_hop(segment_len, overlap))
+
+    def windows():
+        for block in blocks:
+            yield from ring.push(block)
+        yield from ring.flush()
+
+    batch = []
+    for start, end, window in windows():
+        if normalize:
+            peak = np.max(np.abs(window))
+            window = window / peak if peak >= SILENCE_PEAK else None
+        batch.append((start, end, window))
+        if len(batch) == batch_segments:
+            yield from _score_batch(batch, sr, featurize, predict, with_features)
+            batch = []
+    if batch:
+        yield from _score_batch(batch, sr, featurize, predict, with_features)
+
+
+def summarize_segments(segments, threshold=DECISION_THRESHOLD):
+    scores = np.array([segment["score"] for segment in segments if segment["score"] is not None])
+    if len(scores) == 0:
+        return {"label": None, "score": None, "min_score": None, "max_score": None, "segments": segments}
+    score = float(np.mean(scores))
+    return {
+        "label": LABELS[int(score > threshold)],
+        "score": score,
+        "min_score": float(np.min(scores)),
+        "max_score": float(np.max(scores)),
+        "segments": segments,
+    }
+
+
+def score_segments(audio, sr, featurize, predict, segment_seconds, overlap=SEGMENT_OVERLAP, batch_segments=SEGMENT_BATCH):
+    """Score every segment of already-normalized in-memory audio."""
+    segments = list(stream_segments([audio], sr, featurize, predict, segment_seconds, overlap, batch_segments, normalize=False))
+    print(f"[score_segments] : Scored {len(segments)} segments of {segment_seconds}s (overlap {overlap:.0%}) from {len(audio) / sr:.1f}s of audio")
+    return summarize_segments(segments)
+
+
+def score_file(path, sr, featurize, predict, segment_seconds, overlap=SEGMENT_OVERLAP, batch_segments=SEGMENT_BATCH):
+    """Score a file of any length while decoding it block by block; memory does not grow with its length."""
+    blocks = stream_audio_blocks(path, sr)
+    segments = list(stream_segments(blocks, sr, featurize, predict, segment_seconds, overlap, batch_segments))
+    print(f"[score_file] : Scored {len(segments)} segments of {segment_seconds}s (overlap {overlap:.0%}) from {path}")
+    return summarize_segments(segments)
@@ -0,0 +1,287 @@
+#streaming_features.py
+#
+# Incremental version of feature_engine.compute_custom_features for long or live audio.
+# Samples are pushed in blocks of any size; complete STFT frames are processed CHUNK_FRAMES
+# at a time and folded into running per-bin statistics, so memory is bounded by the number
+# of bins and never by the length of the stream. A partial result is available at any point.
+#
+# Parts of one recording can be extracted separately and merged in order. Every part after
+# the first is a continuation extractor: it gets no stft padding at its start and keeps its
+# first n_fft - hop_length samples, so merge() can compute the frames that straddle the
+# boundary from the earlier part's unprocessed tail and that head. Every frame is then
+# computed exactly once, as in the batch functions. Parts before the boundary must hold a
+# multiple of hop_length samples, so the later part's frames stay on the batch frame grid.
+#
+# Three parts of the batch features depend on the whole clip, not only on per-frame sums:
+#   - power_to_db clips at 80 dB below the global peak (MFCC and spectral contrast). Each dB
+#     value goes into a per-bin histogram with exact bucket sums, and the clip is applied
+#     once the peak is known.
+#   - chroma uses a tuning estimated over the whole clip. Chroma is accumulated for every
+#     tuning estimate_tuning can return, and a (magnitude x residual) histogram of the
+#     pitch candidates picks the estimate at the end.
+#   - both of the above resolve the clip level / median magnitude to one histogram bucket,
+#     which leaves a difference well inside feature_engine.FEATURE_TOLERANCE.
+from functools import lru_cache
+
+import numpy as np
+import librosa
+
+from feature_engine import (HOP_LENGTH, N_CHROMA, N_CONTRAST_BANDS, N_FFT, N_MELS, N_MFCC, chroma_basis,
+                            contrast_peak_valley, dct_basis, mel_basis)
+
+# Global Variables
+CHUNK_FRAMES = 64
+TOP_DB = 80.0
+DB_MIN = -100.0  # power_to_db floor for amin=1e-10, ref=1.0
+DB_MAX = 100.0
+DB_RESOLUTION = 0.1
+TUNING_RESOLUTION = 0.01
+TUNING_CANDIDATES = np.linspace(-0.5, 0.5, int(np.ceil(1.0 / TUNING_RESOLUTION)) + 1)  # np.histogram edges in pitch_tuning
+PITCH_DB_MIN = -150.0
+PITCH_DB_MAX = 150.0
+PITCH_DB_RESOLUTION = 0.25
+
+
+@lru_cache(maxsize=4)
+def candidate_chroma_bases(sr, n_fft):
+    """Chroma filterbanks for every tuning candidate, stacked into one (candidates * 12, bins) matrix."""
+    return np.concatenate([chroma_basis(sr, n_fft, float(tuning)) for tuning in TUNING_CANDIDATES[:-1]])
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations per bin (Welford / Chan et al.), mergeable."""
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, values):
+        """Fold in observations laid out along the last axis."""
+        n = values.shape[-1]
+        if n:
+            mean = values.mean(axis=-1, dtype=np.float64)
+            m2 = np.sum((values - mean[..., np.newaxis]) ** 2, axis=-1, dtype=np.float64)
+            self._combine(n, mean, m2)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+
+    def variance(self):
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+
+class ClippedDbMean:
+    """Per-bin time mean of librosa.power_to_db(x, top_db=TOP_DB), where the clip level depends on the global peak."""
+
+    def __init__(self, bins):
+        self.bins = bins
+        self.buckets = int(np.ceil((DB_MAX - DB_MIN) / DB_RESOLUTION))
+        self.counts = np.zeros((bins, self.buckets), dtype=np.int64)
+        self.sums = np.zeros((bins, self.buckets))
+        self.peak = -np.inf
+        self.frames = 0
+
+    def update(self, power):
+        db = librosa.power_to_db(power, top_db=None)
+        self.peak = max(self.peak, float(db.max()))
+        self.frames += db.shape[1]
+        bucket = np.clip(((db - DB_MIN) / DB_RESOLUTION).astype(np.int64), 0, self.buckets - 1)
+        flat = (bucket + np.arange(self.bins)[:, np.newaxis] * self.buckets).ravel()
+        size = self.bins * self.buckets
+        self.counts += np.bincount(flat, minlength=size).reshape(self.bins, self.buckets)
+        self.sums += np.bincount(flat, weights=db.ravel(), minlength=size).reshape(self.bins, self.buckets)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        self.peak = max(self.peak, other.peak)
+        self.frames += other.frames
+
+    def mean(self):
+        floor = self.peak - TOP_DB
+        edge = int(np.clip((floor - DB_MIN) // DB_RESOLUTION, 0, self.buckets - 1))
+        # Buckets wholly below the floor are clipped to it, the floor's own bucket by its mean
+        below = self.counts[:, :edge].sum(axis=1) * floor
+        count = self.counts[:, edge]
+        boundary = np.maximum(self.sums[:, edge] / np.maximum(count, 1), floor) * count
+        above = self.sums[:, edge + 1:].sum(axis=1)
+        return (below + boundary + above) / max(self.frames, 1)
+
+
+class TuningHistogram:
+    """librosa.estimate_tuning over a stream: residual histogram per pitch-magnitude bucket, median resolved at the end."""
+
+    def __init__(self, sr, n_fft, bins_per_octave=N_CHROMA):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.bins_per_octave = bins_per_octave
+        self.buckets = int(np.ceil((PITCH_DB_MAX - PITCH_DB_MIN) / PITCH_DB_RESOLUTION))
+        self.counts = np.zeros((self.buckets, len(TUNING_CANDIDATES) - 1), dtype=np.int64)
+
+    def update(self, power):
+        pitch, mag = librosa.piptrack(S=power, sr=self.sr, n_fft=self.n_fft)
+        pitched = pitch > 0
+        if not pitched.any():
+            return
+        residual = np.mod(self.bins_per_octave * librosa.hz_to_octs(pitch[pitched]), 1.0)
+        residual[residual >= 0.5] -= 1.0
+        column = np.clip(np.searchsorted(TUNING_CANDIDATES, residual, side='right') - 1, 0, self.counts.shape[1] - 1)
+        db = 10.0 * np.log10(np.maximum(mag[pitched], 1e-30))
+        row = np.clip(((db - PITCH_DB_MIN) / PITCH_DB_RESOLUTION).astype(np.int64), 0, self.buckets - 1)
+        np.add.at(self.counts, (row, column), 1)
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def estimate(self):
+        """Index into TUNING_CANDIDATES of the tuning estimate_tuning would return."""
+        per_bucket = self.counts.sum(axis=1)
+        total = per_bucket.sum()
+        if total == 0:
+            return int(np.argmin(np.abs(TUNING_CANDIDATES)))  # pitch_tuning falls back to 0.0
+        median_bucket = int(np.searchsorted(np.cumsum(per_bucket), (total + 1) // 2))
+        return int(np.argmax(self.counts[median_bucket:].sum(axis=0)))
+
+
+class StreamingFeatures:
+    """Push audio in blocks; result() gives the compute_custom_features vector of everything pushed so far."""
+
+    def __init__(self, sr=22050, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH, continuation=False):
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.mel = RunningMoments(N_MELS)
+        self.mel_db = ClippedDbMean(N_MELS)
+        self.contrast_peak = ClippedDbMean(N_CONTRAST_BANDS + 1)
+        self.contrast_valley = ClippedDbMean(N_CONTRAST_BANDS + 1)
+        self.chroma = RunningMoments((len(TUNING_CANDIDATES) - 1, N_CHROMA))
+        self.tuning = TuningHistogram(sr, n_fft)
+        self.samples = 0
+        self.finished = False
+        self.continuation = continuation
+        if continuation:
+            # The frames straddling the start of this part are computed by merge() from this head
+            self._head = np.zeros(0, dtype=np.float32)
+            self._pending = []
+            self._pending_samples = 0
+        else:
+            # stft(center=True) pads n_fft // 2 zeros on both sides; the leading ones go in now
+            self._pending = [np.zeros(n_fft // 2, dtype=np.float32)]
+            self._pending_samples = n_fft // 2
+
+    @property
+    def frames(self):
+        return self.mel.count
+
+    def push(self, samples):
+        if self.finished:
+            raise ValueError("StreamingFeatures already finished")
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.continuation and len(self._head) < self.n_fft - self.hop_length:
+            self._head = np.concatenate([self._head, samples[:self.n_fft - self.hop_length - len(self._head)]])
+        self.samples += len(samples)
+        self._pending.append(samples)
+        self._pending_samples += len(samples)
+        if self._pending_samples >= self.n_fft + (CHUNK_FRAMES - 1) * self.hop_length:
+            self._process_frames()
+        return self
+
+    def finish(self):
+        """Add the trailing stft padding and process the last frames; no more samples can be pushed after this."""
+        if not self.finished:
+            self._pending.append(np.zeros(self.n_fft // 2, dtype=np.float32))
+            self._pending_samples += self.n_fft // 2
+            self._process_frames()
+            self.finished = True
+        return self
+
+    def merge(self, other):
+        """Append the part of the recording `other` (a continuation extractor) holds, right after this one's samples."""
+        if self.finished:
+            raise ValueError("Cannot merge into a finished StreamingFeatures; only the last part may be finished")
+        if not other.continuation:
+            raise ValueError("Only a StreamingFeatures(continuation=True) can be merged after another part")
+        if (other.sr, other.n_mfcc, other.n_fft, other.hop_length) != (self.sr, self.n_mfcc, self.n_fft, self.hop_length):
+            raise ValueError("Cannot merge StreamingFeatures with different analysis settings")
+        self._process_frames()
+        other._process_frames()
+        if other.frames == 0:
+            # Everything the other part holds is still unprocessed, so it simply continues this stream
+            self._pending.extend(other._pending)
+            self._pending_samples += other._pending_samples
+        else:
+            tail = np.concatenate(self._pending) if self._pending else np.zeros(0, dtype=np.float32)
+            if len(tail) % self.hop_length:
+                raise ValueError(f"A part followed by another must hold a multiple of {self.hop_length} samples, got {self.samples}")
+            if len(tail):
+                # The frames that start in this part's tail and end in the other part's head
+                boundary = np.concatenate([tail, other._head])
+                self._update(np.abs(librosa.stft(y=boundary, n_fft=self.n_fft, hop_length=self.hop_length, center=False)))
+            self._pending = list(other._pending)
+            self._pending_samples = other._pending_samples
+        self.finished = other.finished
+        self.mel.merge(other.mel)
+        self.mel_db.merge(other.mel_db)
+        self.chroma.merge(other.chroma)
+        self.tuning.merge(other.tuning)
+        self.contrast_peak.merge(other.contrast_peak)
+        self.contrast_valley.merge(other.contrast_valley)
+        self.samples += other.samples
+        return self
+
+    def result(self):
+        """Features over every complete frame so far; after finish() this matches compute_custom_features."""
+        self._process_frames()
+        if self.frames == 0:
+            raise ValueError("No complete STFT frame yet")
+        return np.concatenate([
+            dct_basis(N_MELS, self.n_mfcc) @ self.mel_db.mean(),
+            self.chroma.mean[self.tuning.estimate()],
+            self.contrast_peak.mean() - self.contrast_valley.mean(),
+            self.mel.mean,
+        ]).astype(np.float32)
+
+    def _process_frames(self):
+        if self._pending_samples < self.n_fft:
+            return
+        buffer = np.concatenate(self._pending)
+        count = 1 + (len(buffer) - self.n_fft) // self.hop_length
+        used = (count - 1) * self.hop_length + self.n_fft
+        magnitude = np.abs(librosa.stft(y=buffer[:used], n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+        # Keep the samples the next frame still needs
+        rest = buffer[count * self.hop_length:]
+        self._pending = [rest]
+        self._pending_samples = len(rest)
+        self._update(magnitude)
+
+    def _update(self, magnitude):
+        power = magnitude ** 2
+        mel_spectrogram = mel_basis(self.sr, self.n_fft) @ power
+        self.mel.update(mel_spectrogram)
+        self.mel_db.update(mel_spectrogram)
+
+        peak, valley = contrast_peak_valley(magnitude, self.sr, n_fft=self.n_fft)
+        self.contrast_peak.update(peak)
+        self.contrast_valley.update(valley)
+
+        self.tuning.update(power)
+        chroma = (candidate_chroma_bases(self.sr, self.n_fft) @ power).reshape(len(TUNING_CANDIDATES) - 1, N_CHROMA, -1)
+        self.chroma.update(librosa.util.normalize(chroma, norm=np.inf, axis=1))
+
+
+def stream_custom_features(blocks, sr=22050, n_mfcc=N_MFCC):
+    """compute_custom_features over an iterable of sample blocks, without holding the whole signal."""
+    extractor = StreamingFeatures(sr=sr, n_mfcc=n_mfcc)
+    for block in blocks:
+        extractor.push(block)
+    return extractor.finish().result()
@@ -0,0 +1,7 @@
+#conftest.py
+#
+# The modules under test are flat modules at the repo root, not an installed package.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+#test_feature_engine.py
+#
+# feature_engine.compute_custom_features against the four separate librosa.feature calls
+# (MFCC, chroma, spectral contrast and mel means) it replaces.
+import numpy as np
+import librosa
+import pytest
+
+from feature_engine import FEATURE_TOLERANCE, N_MFCC, compute_custom_features
+
+# Global Variables
+SECONDS = 5
+
+
+def librosa_features(audio, sr):
+    mfccs = np.mean(librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_MFCC).T, axis=0)
+    chroma = np.mean(librosa.feature.chroma_stft(y=audio, sr=sr).T, axis=0)
+    contrast = np.mean(librosa.feature.spectral_contrast(y=audio, sr=sr).T, axis=0)
+    mel = np.mean(librosa.feature.melspectrogram(y=audio, sr=sr).T, axis=0)
+    return np.concatenate([mfccs, chroma, contrast, mel])
+
+
+def make_signal(kind, sr):
+    rng = np.random.default_rng(0)
+    t = np.arange(SECONDS * sr) / sr
+    if kind == 'chirp':
+        audio = 0.4 * np.sin(2 * np.pi * (220 + 60 * t) * t) + 0.05 * rng.standard_normal(len(t))
+    elif kind == 'chord':
+        audio = sum(0.2 * np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0))
+    elif kind == 'noise':
+        audio = 0.1 * rng.standard_normal(len(t))
+    else:  # a clip only a few frames long
+        audio = 0.3 * rng.standard_normal(sr // 3)
+    return audio.astype(np.float32)
+
+
+@pytest.mark.parametrize('sr', [16000, 22050])
+@pytest.mark.parametrize('kind', ['chirp', 'chord', 'noise', 'short'])
+def test_matches_librosa(kind, sr):
+    audio = make_signal(kind, sr)
+    np.testing.assert_allclose(compute_custom_features(audio, sr=sr), librosa_features(audio, sr),
+                               rtol=FEATURE_TOLERANCE, atol=FEATURE_TOLERANCE)
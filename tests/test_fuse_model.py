@@ -0,0 +1,73 @@
+#test_fuse_model.py
+#
+# fuse_model on a small create_model-style classifier with trained-looking BatchNormalization
+# statistics: the fused file has to match the original as Keras runs it, and the check has
+# to catch a fault in numpy_engine rather than reproduce it on both sides.
+import numpy as np
+import pytest
+
+import fuse_model
+from fuse_model import check_equivalence, fuse_layers, save_fused_model, _source_keras_version
+from numpy_engine import NumpyModel, read_model
+
+# Global Variables
+INPUT_SHAPE = (24, 16)
+
+
+@pytest.fixture(scope='module')
+def saved_model(tmp_path_factory):
+    tf = pytest.importorskip('tensorflow')
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=INPUT_SHAPE),
+        tf.keras.layers.Conv1D(8, kernel_size=3, activation='relu', padding='same'),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.MaxPooling1D(pool_size=2),
+        tf.keras.layers.Dropout(0.3),
+        tf.keras.layers.Bidirectional(tf.keras.layers.GRU(8, return_sequences=True)),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Bidirectional(tf.keras.layers.GRU(4)),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Dense(8, activation='relu'),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.Dense(1, activation='sigmoid'),
+    ])
+    rng = np.random.default_rng(0)
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.BatchNormalization):
+            size = layer.gamma.shape[0]
+            layer.set_weights([rng.uniform(0.5, 1.5, size), rng.normal(0, 0.2, size),
+                               rng.normal(0, 0.2, size), rng.uniform(0.5, 1.5, size)])
+    path = str(tmp_path_factory.mktemp('fuse') / 'model.h5')
+    model.save(path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def fused_model(saved_model):
+    input_shape, specs = read_model(saved_model)
+    fused, _, _, _ = fuse_layers(specs, input_rank=len(input_shape))
+    path = saved_model.replace('.h5', '_fused.h5')
+    save_fused_model(path, fused, input_shape, _source_keras_version(saved_model), saved_model)
+    return path
+
+
+@pytest.fixture(scope='module')
+def features():
+    return np.random.default_rng(1).standard_normal((32,) + INPUT_SHAPE).astype(np.float32)
+
+
+def test_fused_model_matches_keras(saved_model, fused_model, features):
+    max_diff, flips = check_equivalence(saved_model, fused_model, features)
+    assert max_diff < fuse_model.FUSE_TOLERANCE
+    assert flips == 0
+
+
+def test_check_catches_a_numpy_engine_fault(saved_model, fused_model, features, monkeypatch):
+    class SkewedNumpyModel(NumpyModel):
+        def predict(self, x, batch_size=None, verbose=0):
+            return super().predict(x, batch_size=batch_size) * 0.9
+
+    # Compared with itself the fault would cancel out; against Keras it can't
+    monkeypatch.setattr(fuse_model, 'NumpyModel', SkewedNumpyModel)
+    with pytest.raises(ValueError):
+        check_equivalence(saved_model, fused_model, features)
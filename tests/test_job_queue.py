@@ -0,0 +1,34 @@
+#test_job_queue.py
+#
+# JobQueue leases: a file that takes longer than the lease must not be picked up again by
+# another queue on the same database while its worker is still on it.
+import os
+import threading
+import time
+
+import job_queue
+from job_queue import JobQueue
+
+
+def test_slow_file_is_processed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, 'JOB_LEASE_SECONDS', 1.0)
+    monkeypatch.setattr(job_queue, 'JOB_LEASE_RENEW_SECONDS', 0.3)
+    calls = []
+    done = threading.Event()
+
+    def slow(audio_bytes, filename):
+        calls.append(filename)
+        time.sleep(3)
+        done.set()
+        return 'REAL'
+
+    queues = [JobQueue(slow, db_path=os.path.join(tmp_path, 'jobs.db'), spool_dir=os.path.join(tmp_path, 'spool'), num_workers=1)
+              for _ in range(2)]
+    job_id = queues[0].submit([('clip.wav', b'\0' * 64)])
+    assert done.wait(10)
+    time.sleep(1.5)  # longer than the queues' poll interval, so a second claim would have started
+
+    status = queues[1].status(job_id)
+    assert calls == ['clip.wav']
+    assert status['status'] == 'finished'
+    assert status['files'][0]['prediction'] == 'REAL'
@@ -0,0 +1,72 @@
+#test_process_audio.py
+#
+# Smoke test: a real recording goes through /process_audio on each inference backend and a
+# prediction has to come back. voice.py builds its model at import, so every backend runs
+# in a fresh interpreter. Needs the trained classifier as a full-model .h5 (the numpy
+# backend reads the layer config as well as the weights) at MODEL_PATH, default bestbigru.h5;
+# the tflite and onnx backends serve an fp32 export of it made the way export_runtime.py does.
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Global Variables
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.abspath(os.environ.get('MODEL_PATH', os.path.join(REPO_DIR, 'bestbigru.h5')))
+CLIP_PATH = os.path.join(REPO_DIR, 'deployment', 'audio-1707329137301.mp3')
+
+SCRIPT = """
+import io, json, os, sys
+import voice
+with open(sys.argv[1], 'rb') as f:
+    data = {'audio_files': (io.BytesIO(f.read()), os.path.basename(sys.argv[1]))}
+response = voice.app.test_client().post('/process_audio', data=data, content_type='multipart/form-data')
+print(json.dumps({'status': response.status_code, 'body': response.get_json()}))
+sys.stdout.flush()
+# The worker processes share this stdout pipe, so stop them before leaving
+voice.decoder_pool.shutdown()
+voice.feature_pool.shutdown()
+os._exit(0)
+"""
+
+
+def export_model(backend, output_dir):
+    tf = pytest.importorskip('tensorflow')
+    if backend == 'onnx':
+        pytest.importorskip('tf2onnx')
+        pytest.importorskip('onnxruntime')
+    from clip_broadcast import with_steps
+    from export_runtime import export_onnx, export_tflite
+    from feature_engine import custom_feature_length
+
+    model = with_steps(tf.keras.models.load_model(MODEL_PATH, compile=False), custom_feature_length())
+    if backend == 'tflite':
+        return export_tflite(model, str(output_dir), 'model', modes=('fp32',))['tflite_fp32']
+    return export_onnx(model, str(output_dir), 'model', None, modes=('fp32',))['onnx_fp32']
+
+
+@pytest.mark.parametrize('backend', ['keras', 'numpy', 'tflite', 'onnx'])
+def test_process_audio_classifies_a_real_clip(backend, tmp_path):
+    pytest.importorskip('flask_cors')
+    if backend == 'keras':
+        pytest.importorskip('tensorflow')
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip(f"No trained model at {MODEL_PATH}; set MODEL_PATH")
+    model_path = export_model(backend, tmp_path) if backend in ('tflite', 'onnx') else MODEL_PATH
+
+    env = dict(os.environ, MODEL_BACKEND=backend, MODEL_PATH=model_path,
+               PYTHONPATH=os.pathsep.join([REPO_DIR, os.path.join(REPO_DIR, 'functions')]))
+    # Run in tmp_path so the result store, job queue and caches don't touch the checkout
+    result = subprocess.run([sys.executable, '-c', SCRIPT, CLIP_PATH], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr
+    response = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert response['status'] == 200
+    # A file that fails anywhere in the pipeline is left out of "audios" rather than failing the request
+    audios = response['body']['audios']
+    assert len(audios) == 1, result.stdout
+    assert audios[0]['filename'] == os.path.basename(CLIP_PATH)
+    assert audios[0]['prediction'] in ('FAKE', 'REAL')
@@ -0,0 +1,59 @@
+#test_streaming_features.py
+#
+# StreamingFeatures, pushed whole or as separately extracted parts merged in order, against
+# the batch feature_engine.compute_custom_features.
+import numpy as np
+import pytest
+
+from feature_engine import FEATURE_TOLERANCE, HOP_LENGTH, compute_custom_features
+from streaming_features import StreamingFeatures
+
+# Global Variables
+SR = 22050
+BLOCK = 3000
+
+
+@pytest.fixture(scope='module')
+def clip():
+    t = np.arange(8 * SR) / SR
+    noise = np.random.default_rng(0).standard_normal(len(t))
+    return (0.4 * np.sin(2 * np.pi * (220 + 60 * t) * t) + 0.05 * noise).astype(np.float32)
+
+
+def extract_parts(audio, cuts):
+    edges = [0, *cuts, len(audio)]
+    merged = None
+    for index, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        part = StreamingFeatures(sr=SR, continuation=index > 0)
+        for offset in range(start, end, BLOCK):
+            part.push(audio[offset:min(end, offset + BLOCK)])
+        if end == len(audio):
+            part.finish()
+        merged = part if merged is None else merged.merge(part)
+    return merged.result()
+
+
+def test_streaming_matches_batch(clip):
+    np.testing.assert_allclose(extract_parts(clip, []), compute_custom_features(clip, sr=SR), rtol=FEATURE_TOLERANCE, atol=FEATURE_TOLERANCE)
+
+
+@pytest.mark.parametrize('cuts', [
+    [4 * SR // HOP_LENGTH * HOP_LENGTH],  # two halves
+    [100 * HOP_LENGTH, 101 * HOP_LENGTH, 250 * HOP_LENGTH],  # including a part shorter than one frame
+    [3 * HOP_LENGTH, 5 * HOP_LENGTH],  # first parts shorter than one frame
+])
+def test_merged_parts_match_batch(clip, cuts):
+    np.testing.assert_allclose(extract_parts(clip, cuts), compute_custom_features(clip, sr=SR), rtol=FEATURE_TOLERANCE, atol=FEATURE_TOLERANCE)
+
+
+def test_merge_refuses_parts_it_cannot_join_exactly(clip):
+    finished = StreamingFeatures(sr=SR).push(clip[:SR]).finish()
+    with pytest.raises(ValueError):
+        finished.merge(StreamingFeatures(sr=SR, continuation=True).push(clip[SR:]))
+
+    with pytest.raises(ValueError):
+        StreamingFeatures(sr=SR).push(clip[:SR]).merge(StreamingFeatures(sr=SR).push(clip[SR:]))
+
+    unaligned = SR // HOP_LENGTH * HOP_LENGTH + 1
+    with pytest.raises(ValueError):
+        StreamingFeatures(sr=SR).push(clip[:unaligned]).merge(StreamingFeatures(sr=SR, continuation=True).push(clip[unaligned:]))
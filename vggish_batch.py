@@ -0,0 +1,72 @@
+#vggish_batch.py
+#
+# Batched VGGish embedding. The TF Hub module only takes a single 1-D waveform, so many
+# clips are packed into one waveform on 0.96 s example boundaries and embedded with one
+# traced graph call; the per-clip embeddings are then sliced back out.
+#
+# VGGish frames the log-mel spectrogram with a 400-sample window / 160-sample hop and
+# groups 96 frames per example, so example j reads samples [15360 j, 15360 j + 15600).
+# Each clip gets one spare example slot, which keeps every kept example from reading
+# into the next clip: the embeddings are identical to embedding each clip on its own.
+import numpy as np
+import tensorflow as tf
+import tensorflow_hub as hub
+
+# Global Variables
+VGGISH_MODEL_HANDLE = 'https://tfhub.dev/google/vggish/1'
+STFT_WINDOW = 400
+STFT_HOP = 160
+EXAMPLE_FRAMES = 96
+EXAMPLE_HOP = EXAMPLE_FRAMES * STFT_HOP  # 15360 samples = 0.96 s at 16 kHz
+MAX_BATCH_EXAMPLES = 512
+
+
+def examples_in_clip(num_samples):
+    if num_samples < STFT_WINDOW:
+        return 0
+    return (1 + (num_samples - STFT_WINDOW) // STFT_HOP) // EXAMPLE_FRAMES
+
+
+class BatchedVGGish:
+    """Frozen VGGish that embeds many clips per graph call and returns one (examples, 128) array per clip."""
+
+    def __init__(self, handle=VGGISH_MODEL_HANDLE, max_batch_examples=MAX_BATCH_EXAMPLES):
+        self.max_batch_examples = max_batch_examples
+        # hub.load restores the SavedModel for inference only; nothing is tracked as trainable
+        self._model = hub.load(handle)
+        self._embed = tf.function(
+            lambda waveform: self._model(waveform),
+            input_signature=[tf.TensorSpec(shape=[None], dtype=tf.float32)],
+        )
+
+    def _embed_packed(self, clips):
+        counts = [examples_in_clip(len(clip)) for clip in clips]
+        slots = [count + 1 if count else 0 for count in counts]
+        packed = np.zeros(sum(slots) * EXAMPLE_HOP, dtype=np.float32)
+        starts = []
+        slot = 0
+        for clip, count, width in zip(clips, counts, slots):
+            starts.append(slot)
+            if width:
+                usable = min(len(clip), width * EXAMPLE_HOP)
+                packed[slot * EXAMPLE_HOP:slot * EXAMPLE_HOP + usable] = clip[:usable]
+            slot += width
+
+        embeddings = self._embed(tf.convert_to_tensor(packed)).numpy() if len(packed) else np.zeros((0, 128), np.float32)
+        return [embeddings[start:start + count] for start, count in zip(starts, counts)]
+
+    def embed(self, clips):
+        """Embed a list of 16 kHz waveforms; returns a list of (examples, 128) arrays in the same order."""
+        results = []
+        batch, batch_examples = [], 0
+        for clip in clips:
+            clip = np.asarray(clip, dtype=np.float32)
+            clip_examples = examples_in_clip(len(clip)) + 1
+            if batch and batch_examples + clip_examples > self.max_batch_examples:
+                results.extend(self._embed_packed(batch))
+                batch, batch_examples = [], 0
+            batch.append(clip)
+            batch_examples += clip_examples
+        if batch:
+            results.extend(self._embed_packed(batch))
+        return results
@@ -0,0 +1,159 @@
+#vggish_bundle.py
+#
+# Local, checksummed copy of the VGGish SavedModel so workers start without reaching
+# TF Hub. Build the bundle once on a machine with network access:
+#
+#     python vggish_bundle.py export --dest models/vggish-1
+#
+# and ship the directory with the service. The bundle carries a bundle.json manifest
+# with the source handle and a SHA-256 over every file; loading verifies it, and
+# VGGISH_SHA256 can pin the expected checksum from the deployment config. Servers call
+# load_vggish_in_background() at import: a missing or altered bundle stops startup, and
+# the model itself loads on a background thread.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+
+import numpy as np
+
+# Global Variables
+VGGISH_MODEL_HANDLE = 'https://tfhub.dev/google/vggish/1'
+VGGISH_BUNDLE_PATH = os.environ.get(
+    'VGGISH_BUNDLE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'vggish-1'))
+VGGISH_SHA256 = os.environ.get('VGGISH_SHA256')
+ALLOW_HUB_DOWNLOAD = os.environ.get('VGGISH_ALLOW_DOWNLOAD', '0') == '1'
+MANIFEST_NAME = 'bundle.json'
+
+
+def directory_checksum(path):
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if root == path and name == MANIFEST_NAME:
+                continue
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode('utf-8') + b'\0')
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_bundle(dest, handle=VGGISH_MODEL_HANDLE):
+    import tensorflow_hub as hub
+
+    source = hub.resolve(handle)
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    shutil.copytree(source, dest)
+    manifest = {"handle": handle, "sha256": directory_checksum(dest), "exported_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+    with open(os.path.join(dest, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[export_bundle] : Exported {handle} to {dest} (sha256 {manifest['sha256']})")
+    return manifest
+
+
+def verify_bundle(path):
+    with open(os.path.join(path, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    checksum = directory_checksum(path)
+    expected = VGGISH_SHA256 or manifest["sha256"]
+    if checksum != expected:
+        raise ValueError(f"VGGish bundle at {path} has checksum {checksum}, expected {expected}")
+    return manifest
+
+
+def resolve_vggish(path=VGGISH_BUNDLE_PATH):
+    """Return the verified local bundle path, or the TF Hub handle when downloads are explicitly allowed."""
+    if os.path.exists(os.path.join(path, MANIFEST_NAME)):
+        manifest = verify_bundle(path)
+        print(f"[resolve_vggish] : Using local VGGish bundle {path} ({manifest['handle']})")
+        return path
+    if ALLOW_HUB_DOWNLOAD:
+        print(f"[resolve_vggish] : No bundle at {path}, falling back to {VGGISH_MODEL_HANDLE}")
+        return VGGISH_MODEL_HANDLE
+    raise FileNotFoundError(
+        f"No VGGish bundle at {path}. Run 'python vggish_bundle.py export --dest {path}' "
+        f"or set VGGISH_ALLOW_DOWNLOAD=1")
+
+
+class LazyVGGish:
+    """BatchedVGGish that is loaded (and traced) on first use or by a background warm-up thread."""
+
+    def __init__(self, path=VGGISH_BUNDLE_PATH):
+        self.path = path
+        self.load_seconds = None
+        self.error = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                try:
+                    # TensorFlow itself is only imported here, so importing this module stays cheap
+                    from vggish_batch import BatchedVGGish, EXAMPLE_HOP, STFT_WINDOW
+
+                    model = BatchedVGGish(resolve_vggish(self.path))
+                    model.embed([np.zeros(EXAMPLE_HOP + STFT_WINDOW, dtype=np.float32)])
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self._model = model
+                self.load_seconds = time.perf_counter() - start
+                print(f"[LazyVGGish] : VGGish ready in {self.load_seconds:.2f}s")
+            return self._model
+
+    def warm_up_in_background(self):
+        def warm_up():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"[LazyVGGish] : Background warm-up failed: {e}")
+                traceback.print_exc()
+
+        thread = threading.Thread(target=warm_up, name="vggish-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def embed(self, clips):
+        return self.get().embed(clips)
+
+    def status(self):
+        return {"loaded": self._model is not None, "load_seconds": self.load_seconds, "error": self.error, "path": self.path}
+
+
+def load_vggish_in_background(path=VGGISH_BUNDLE_PATH):
+    """Verify the bundle now, raising if it is missing or altered, and load VGGish on a background thread."""
+    resolve_vggish(path)
+    vggish = LazyVGGish(path)
+    vggish.warm_up_in_background()
+    return vggish
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or verify the offline VGGish bundle.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Download VGGish from TF Hub into a local bundle')
+    export_parser.add_argument('--dest', default=VGGISH_BUNDLE_PATH, help='Bundle directory to create')
+    export_parser.add_argument('--handle', default=VGGISH_MODEL_HANDLE, help='TF Hub handle to export')
+    verify_parser = subparsers.add_parser('verify', help='Check a bundle against its manifest')
+    verify_parser.add_argument('--path', default=VGGISH_BUNDLE_PATH, help='Bundle directory to verify')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_bundle(args.dest, args.handle)
+    else:
+        manifest = verify_bundle(args.path)
+        print(f"[main] : Bundle {args.path} OK ({manifest['handle']}, sha256 {manifest['sha256']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,53 @@
 #flask voice.py
-import numpy as np
-import tensorflow as tf
-import librosa
-from pydub import AudioSegment
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from cors_config import init_cors
+from inference_queue import InferenceQueue
+from feature_pool import FeaturePool
+from feature_engine import custom_feature_length, feature_config_key
+from prediction_cache import PredictionCache
+from result_store import ResultStore
+from decoder_pool import DecoderPool
+from fuse_model import is_fused_model
+from runtime_backends import load_backend
+from clip_broadcast import HostTiledModel, tile_over_channels
+from live_scoring import LiveSession, warm_up as warm_up_live_scoring
+from job_queue import JobQueue
+from admission import AdmissionController, Overloaded
+from audio_decode import estimate_audio_seconds
+from deadline import Deadline, DeadlineExceeded
+import json
 import os
-import tempfile
+import time
 import traceback
-import json
+
+try:
+    from flask_sock import Sock
+except ImportError:  # the WebSocket route is optional; /stream_audio serves live audio over chunked HTTP without it
+    Sock = None
 
 # Global Variables
 PORT = 8080
 SUPPORTED_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.aac', '.3gp')
+MODEL_PATH = os.environ.get('MODEL_PATH', 'bestbigru.h5')  # or the inference-only export from fuse_model.py
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'keras')  # 'keras', 'numpy', 'tflite' or 'onnx'
+TARGET_SR = 16000
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '32'))
+MAX_QUEUE_WAIT_MS = float(os.environ.get('MAX_QUEUE_WAIT_MS', '10'))
+STREAM_READ_BYTES = 4096  # ~128 ms of 16 kHz 16-bit mono per read of a live upload
 
 app = Flask(__name__)
 init_cors(app)
 
+# DSP and decoder workers run in fresh interpreters, so they hold no TensorFlow state or model
+feature_pool = FeaturePool()
+decoder_pool = DecoderPool()
+
 def allowed_file(filename):
     return filename.lower().endswith(SUPPORTED_EXTENSIONS)
 
 def create_model(input_shape):
+    import tensorflow as tf
+
     model = tf.keras.Sequential([
         tf.keras.layers.Input(shape=input_shape),
         tf.keras.layers.Conv1D(64, kernel_size=3, activation='relu', padding='same'),
@@ -52,51 +79,54 @@ def create_model(input_shape):
     return model
 
 input_shape = (28, 295)
-model = create_model(input_shape)
-model.load_weights('bestbigru.h5')
+if MODEL_BACKEND != 'keras':
+    # NumPy engine, or a TFLite / ONNX export from export_runtime.py; none of them need TensorFlow
+    model = load_backend(MODEL_BACKEND, MODEL_PATH)
+elif is_fused_model(MODEL_PATH):
+    # Fused exports have their own layer stack (no Dropout, BatchNormalization folded), so load them whole
+    import tensorflow as tf
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+else:
+    model = create_model(input_shape)
+    model.load_weights(MODEL_PATH)
+# Requests submit the compact custom feature vector; it is repeated across the input channels
+# inside the graph (or per batch on the host for the non-TensorFlow runtimes), not per request.
+# Its length (n_mfcc + 12 + 7 + 128) sets the step axis the model actually runs on
+clip_steps = custom_feature_length()
+if MODEL_BACKEND == 'keras':
+    # Traced once per batch-size bucket and warmed up here, so requests skip model.predict overhead and tracing
+    from compiled_predict import CompiledPredictor
+    model = CompiledPredictor(tile_over_channels(model, clip_steps), input_shapes=[(clip_steps,)]).warm_up()
+else:
+    model = HostTiledModel(model, clip_steps)
+inference_queue = InferenceQueue(model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_QUEUE_WAIT_MS)
+prediction_cache = PredictionCache(MODEL_PATH, feature_config_key(TARGET_SR, input_shape=input_shape, resampler='soxr_hq', backend=MODEL_BACKEND))
+result_store = ResultStore()
+admission = AdmissionController()
+warm_up_live_scoring(TARGET_SR)
 
 @app.route('/')
 @app.route('/home')
 def home():
     return render_template('main.html')
 
-def load_audio_with_pydub(file_path):
+def load_audio(audio_bytes, filename, deadline=None):
     try:
-        audio = AudioSegment.from_file(file_path)
-        sr = audio.frame_rate
-        audio_data = np.array(audio.get_array_of_samples(), dtype=np.float32)
-        if audio.channels == 2:  # Convert stereo to mono if necessary
-            audio_data = audio_data.reshape(-1, 2).mean(axis=1)
-        print(f"[load_audio_with_pydub] : Successfully loaded audio file {file_path} with sample rate {sr}")
+        # Decoded in memory straight to TARGET_SR; WAV is parsed in this thread, everything else goes
+        # to the long-lived decoder workers instead of a fresh ffmpeg process per file
+        audio_data, sr = decoder_pool.decode(audio_bytes, filename, target_sr=TARGET_SR, deadline=deadline)
+        print(f"[load_audio] : Successfully decoded {filename} with sample rate {sr}")
         return audio_data, sr
     except Exception as e:
-        print(f"[load_audio_with_pydub] : Error loading audio file with pydub: {e}")
+        print(f"[load_audio] : Error decoding {filename}: {e}")
         traceback.print_exc()
         raise
 
-def extract_custom_features(audio_data):
+def extract_custom_features(audio_data, deadline=None):
     try:
-        # Ensure audio is resampled to 16kHz for consistency
-        audio_data = librosa.resample(audio_data, orig_sr=22050, target_sr=16000)
-        
-        mfcc_features = librosa.feature.mfcc(y=audio_data, sr=16000, n_mfcc=20)
-        mfcc_features = np.mean(mfcc_features.T, axis=0)
-
-        chroma_features = librosa.feature.chroma_stft(y=audio_data, sr=16000)
-        chroma_features = np.mean(chroma_features.T, axis=0)
-
-        spectral_contrast = librosa.feature.spectral_contrast(y=audio_data, sr=16000)
-        spectral_contrast = np.mean(spectral_contrast.T, axis=0)
-
-        mel_spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=16000)
-        mel_spectrogram = np.mean(mel_spectrogram.T, axis=0)
-
-        combined_features = np.concatenate([
-            mfcc_features,
-            chroma_features,
-            spectral_contrast,
-            mel_spectrogram,
-        ])
+        # Audio arrives at TARGET_SR from the decode stage; one STFT feeds the MFCC, chroma,
+        # spectral contrast and mel means, computed in the feature worker pool
+        combined_features = feature_pool.extract(audio_data, sr=TARGET_SR, deadline=deadline)
         
         print(f"[extract_custom_features] : Successfully extracted custom features with shape {combined_features.shape}")
         return combined_features
@@ -105,9 +135,24 @@ def extract_custom_features(audio_data):
         traceback.print_exc()
         raise
 
+@app.errorhandler(Overloaded)
+def handle_overloaded(e):
+    print(f"[handle_overloaded] : Turned away {request.path} with {e.status}: {e}")
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(e):
+    print(f"[handle_deadline_exceeded] : Gave up on {request.path}: {e}")
+    return jsonify({"error": str(e)}), 504
+
 @app.route('/process_audio', methods=['POST'])
 def process_audio():
     print("[process_audio] : Processing audio files")
+    # Every stage below drops this request's work once the deadline passes (504 via handle_deadline_exceeded)
+    deadline = Deadline.from_header(request.headers.get('X-Request-Timeout'))
     files = request.files.getlist('audio_files')
     audios = []
 
@@ -115,6 +160,7 @@ def process_audio():
         print("[process_audio] : No files found in the request")
         return jsonify({"error": "No files found in the request"}), 400
 
+    uploads = []
     for file in files:
         filename = file.filename
         if not allowed_file(filename):
@@ -122,41 +168,64 @@ def process_audio():
             print(error_msg)
             return jsonify({"error": error_msg}), 400
 
-        try:
-            temp_dir = tempfile.gettempdir()
-            temp_path = os.path.join(temp_dir, filename)
-            file.save(temp_path)
+        # Resubmitted recordings are answered from the prediction cache without decoding
+        audio_bytes = file.read()
+        cache_key = prediction_cache.key(audio_bytes)
+        uploads.append((filename, audio_bytes, cache_key, prediction_cache.get(cache_key)))
+
+    # Only audio that still has to go through the pipeline counts against its capacity;
+    # a full pipeline answers 429/503 with Retry-After (handle_overloaded) before any work starts
+    estimates = [estimate_audio_seconds(audio_bytes) if cached_label is None else 0.0
+                 for _, audio_bytes, _, cached_label in uploads]
+    ticket = admission.admit(sum(estimates), timeout=min(admission.max_wait_seconds, deadline.remaining()))
+    try:
+        pending = []
+        for (filename, audio_bytes, cache_key, cached_label), estimate in zip(uploads, estimates):
+            if cached_label is not None:
+                print(f"[process_audio] : Cache hit for {filename}")
+                pending.append((filename, cache_key, None, cached_label))
+                continue
 
             try:
-                audio_data, sr = load_audio_with_pydub(temp_path)
+                audio_data, sr = load_audio(audio_bytes, filename, deadline)
                 print(f"[process_audio] : Audio data loaded with sample rate {sr}")
+                ticket.correct(estimate, len(audio_data) / sr)
 
                 # Extract custom features
-                custom_features = extract_custom_features(audio_data)
+                custom_features = extract_custom_features(audio_data, deadline)
                 print(f"[process_audio] : Custom features extracted with shape {custom_features.shape}")
 
-                # Reshape features for prediction
-                num_time_frames = input_shape[1]
-                custom_features_expanded = np.repeat(custom_features[:, np.newaxis], num_time_frames, axis=1)
-                custom_features_expanded = np.expand_dims(custom_features_expanded, axis=0)  # Add batch dimension
+                # Queue for prediction; the shared inference queue batches it with other in-flight requests
+                pending.append((filename, cache_key, inference_queue.submit(custom_features, deadline), None))
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                print(f"[process_audio] : Error processing file {filename}: {e}")
+                traceback.print_exc()
+
+        for filename, cache_key, future, cached_label in pending:
+            if cached_label is not None:
+                audios.append({"filename": filename, "prediction": cached_label})
+                continue
 
-                # Make prediction
-                prediction = model.predict(custom_features_expanded)
-                predicted_class = int(prediction > 0.5)  # Convert sigmoid output to binary class
+            try:
+                prediction = deadline.wait(future, "inference")
+                predicted_class = int(prediction[0] > 0.5)  # Convert sigmoid output to binary class
                 print(f"[process_audio] : Prediction made: {prediction}")
 
                 # Map predictions to labels
                 labels = ['FAKE', 'REAL']
                 predicted_label = labels[predicted_class]
+                prediction_cache.put(cache_key, predicted_label)
 
                 audios.append({"filename": filename, "prediction": predicted_label})
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                print(f"[process_audio] : Error processing file {filename}: {e}")
+                print(f"[process_audio] : Error predicting file {filename}: {e}")
                 traceback.print_exc()
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                print(f"[process_audio] : Temporary file {temp_path} deleted")
+    finally:
+        ticket.release()
 
     save_results(audios)
 
@@ -167,36 +236,189 @@ def process_audio():
     print(f"[process_audio] : Response: {response.get_data(as_text=True)}")
     return response
 
+def start_live_session(options):
+    # Live features go through the same inference queue (and model) as uploaded files
+    return LiveSession(inference_queue.predict, TARGET_SR,
+                       sample_rate=int(options.get('sample_rate', 16000)),
+                       encoding=options.get('encoding', 's16le'),
+                       channels=int(options.get('channels', 1)))
+
+@app.route('/stream_audio', methods=['POST'])
+def stream_audio():
+    """Live scoring over chunked HTTP: raw PCM in the request body, one JSON update per line back."""
+    try:
+        session = start_live_session(request.args)
+    except (ValueError, ImportError) as e:
+        print(f"[stream_audio] : Error starting live session: {e}")
+        return jsonify({"error": str(e)}), 400
+    filename = request.args.get('filename', f"live-{int(time.time())}")
+
+    def generate():
+        try:
+            while True:
+                chunk = request.stream.read(STREAM_READ_BYTES)
+                if not chunk:
+                    break
+                for update in session.feed(chunk):
+                    yield json.dumps(update) + '\n'
+            result = session.finish()
+            print(f"[stream_audio] : {filename}: {result['label']} after {result['seconds']:.1f}s, verdict in {result['verdict_ms']:.0f} ms")
+            save_results([{"filename": filename, "prediction": result["label"]}])
+            yield json.dumps(result) + '\n'
+        except Exception as e:
+            print(f"[stream_audio] : Error scoring live audio {filename}: {e}")
+            traceback.print_exc()
+            yield json.dumps({"error": str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/stream_audio')
+    def stream_audio_socket(ws):
+        """Live scoring over a WebSocket: a JSON options message, binary audio messages (PCM or Opus packets), then "end"."""
+        try:
+            options = json.loads(ws.receive())
+            session = start_live_session(options)
+            filename = options.get('filename', f"live-{int(time.time())}")
+            while True:
+                message = ws.receive()
+                if isinstance(message, str):
+                    break
+                for update in session.feed(message):
+                    ws.send(json.dumps(update))
+            result = session.finish()
+            print(f"[stream_audio_socket] : {filename}: {result['label']} after {result['seconds']:.1f}s, verdict in {result['verdict_ms']:.0f} ms")
+            save_results([{"filename": filename, "prediction": result["label"]}])
+            ws.send(json.dumps(result))
+        except Exception as e:
+            print(f"[stream_audio_socket] : Error scoring live audio: {e}")
+            traceback.print_exc()
+            ws.send(json.dumps({"error": str(e)}))
+
 def save_results(audios):
     try:
-        results_path = 'results.json'
-        if os.path.exists(results_path):
-            with open(results_path, 'r') as f:
-                all_results = json.load(f)
-        else:
-            all_results = []
-
-        all_results.extend(audios)
-
-        with open(results_path, 'w') as f:
-            json.dump(all_results, f)
-        print(f"[save_results] : Results successfully saved to {results_path}")
+        result_store.append(audios)
+        print(f"[save_results] : Results successfully saved to {result_store.db_path}")
     except Exception as e:
         print(f"[save_results] : Error saving results: {e}")
         traceback.print_exc()
 
+def classify_job_file(audio_bytes, filename):
+    # Same cache, decoder, feature pool and inference queue as /process_audio, one file at a time
+    cache_key = prediction_cache.key(audio_bytes)
+    predicted_label = prediction_cache.get(cache_key)
+    if predicted_label is None:
+        # Background work waits for pipeline capacity instead of being turned away
+        with admission.acquire(estimate_audio_seconds(audio_bytes)) as ticket:
+            audio_data, sr = load_audio(audio_bytes, filename)
+            ticket.correct(ticket.seconds, len(audio_data) / sr)
+            prediction = inference_queue.predict(extract_custom_features(audio_data))
+        predicted_label = ['FAKE', 'REAL'][int(prediction[0] > 0.5)]
+        prediction_cache.put(cache_key, predicted_label)
+    else:
+        print(f"[classify_job_file] : Cache hit for {filename}")
+    save_results([{"filename": filename, "prediction": predicted_label}])
+    return predicted_label
+
+job_queue = JobQueue(classify_job_file)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Accept a batch upload and return its job id at once; poll GET /jobs/<job_id> for per-file results."""
+    files = request.files.getlist('audio_files')
+    if not files:
+        print("[submit_job] : No files found in the request")
+        return jsonify({"error": "No files found in the request"}), 400
+    for file in files:
+        if not allowed_file(file.filename):
+            error_msg = f"[submit_job] : File type {file.filename} is not allowed. Supported types are {SUPPORTED_EXTENSIONS}"
+            print(error_msg)
+            return jsonify({"error": error_msg}), 400
+
+    try:
+        job_id = job_queue.submit([(file.filename, file.read()) for file in files])
+    except Exception as e:
+        print(f"[submit_job] : Error queueing job: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "Error queueing job"}), 500
+    print(f"[submit_job] : Queued job {job_id} with {len(files)} files")
+    response = jsonify({"job_id": job_id, "status": "queued", "total": len(files)})
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job_id}"
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """Labels of the files finished so far, in the /process_audio response shape."""
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job {job_id}"}), 404
+    audios = [{"filename": f["filename"], "prediction": f["prediction"]} for f in job["files"] if f["status"] == 'done']
+    return jsonify({"message": f"{len(audios)} of {job['total']} files classified", "status": job["status"], "audios": audios})
+
+@app.route('/job_stats', methods=['GET'])
+def get_job_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/admission_stats', methods=['GET'])
+def get_admission_stats():
+    return jsonify(admission.stats())
+
+@app.route('/inference_settings', methods=['GET'])
+def get_inference_settings():
+    settings = inference_queue.settings()
+    if hasattr(model, 'settings'):
+        settings["predictor"] = model.settings()
+    return jsonify(settings)
+
+@app.route('/decoder_stats', methods=['GET'])
+def get_decoder_stats():
+    return jsonify(decoder_pool.stats())
+
+@app.route('/feature_stats', methods=['GET'])
+def get_feature_stats():
+    return jsonify(feature_pool.stats())
+
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(prediction_cache.stats())
+
 @app.route('/audio_results', methods=['GET'])
 def get_audio_results():
     try:
-        results_path = 'results.json'
-        if os.path.exists(results_path):
-            with open(results_path, 'r') as f:
-                audios = json.load(f)
-            print(f"[get_audio_results] : Successfully retrieved results")
-            return jsonify(audios)
-        else:
-            print(f"[get_audio_results] : No results found at {results_path}")
+        filters = {
+            "filename": request.args.get('filename'),
+            "label": request.args.get('label'),
+            "since": request.args.get('since', type=float),
+            "until": request.args.get('until', type=float),
+        }
+        limit = request.args.get('limit', default=100, type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        descending = request.args.get('order', default='asc').lower() == 'desc'
+
+        total = result_store.count(**filters)
+        if total == 0:
+            print(f"[get_audio_results] : No results found in {result_store.db_path}")
             return jsonify({"message": "No results found"}), 404
+
+        audios = result_store.query(limit=limit, offset=offset, descending=descending, **filters)
+        print(f"[get_audio_results] : Successfully retrieved {len(audios)} of {total} results")
+
+        # The body stays a plain list for the app; paging details travel in headers
+        response = jsonify(audios)
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Offset'] = str(offset)
+        response.headers['X-Limit'] = str(limit)
+        return response
     except Exception as e:
         print(f"[get_audio_results] : Error retrieving results: {e}")
         traceback.print_exc()
@@ -0,0 +1,327 @@
+#voice_asgi.py
+#
+# asyncio serving mode for voice.py: the same /process_audio and /audio_results contract as
+# the Flask app, as a plain ASGI application (`uvicorn voice_asgi:app`, or `python voice_asgi.py`).
+# Request bodies are read and multipart-parsed on the event loop as they arrive, so a slow
+# or idle upload holds a coroutine rather than a worker thread, and each file starts
+# decoding as soon as its part is complete. The blocking stages run on dedicated executors
+# of fixed size, each behind a semaphore so excess work waits on the event loop instead of
+# piling up in an executor queue:
+#   decode     WAV parsing; compressed uploads go to the DecoderPool processes and only
+#              their futures are awaited
+#   dsp        threads handing clips to the FeaturePool processes and waiting on them
+#   io         prediction-cache hashing and the SQLite ResultStore
+# Inference needs no executor: InferenceQueue already batches on its own thread and its
+# futures are awaited directly. The model, worker pools, caches and result store are the
+# ones voice.py builds at import.
+import asyncio
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+import voice
+from admission import Overloaded
+from audio_decode import decode_upload, estimate_audio_seconds, is_wav
+from deadline import Deadline, DeadlineExceeded
+
+try:
+    import uvicorn
+except ImportError:  # any ASGI server can run `voice_asgi:app`; uvicorn is only needed for `python voice_asgi.py`
+    uvicorn = None
+
+# Global Variables
+PORT = voice.PORT
+DECODE_THREADS = int(os.environ.get('DECODE_THREADS', '4'))
+DSP_THREADS = int(os.environ.get('DSP_THREADS', str(voice.feature_pool.max_workers)))
+IO_THREADS = int(os.environ.get('IO_THREADS', '4'))
+LABELS = ['FAKE', 'REAL']
+
+
+class Stage:
+    """Fixed-size thread pool for one blocking stage; callers beyond its size wait on the event loop."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.running = 0
+        self.waiting = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"asgi-{name}")
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def run(self, func, *args):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {"workers": self.workers, "running": self.running, "waiting": self.waiting}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+stages = {
+    "decode": Stage("decode", DECODE_THREADS),
+    "dsp": Stage("dsp", DSP_THREADS),
+    "io": Stage("io", IO_THREADS),
+}
+
+
+async def send_json(send, body, status=200, headers=()):
+    payload = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def read_uploads(scope, receive, field='audio_files'):
+    """Yield (filename, bytes) for each file of a multipart body as soon as its part is complete."""
+    content_type, options = parse_options_header(dict(scope["headers"]).get(b"content-type", b"").decode('latin-1'))
+    if content_type != 'multipart/form-data' or 'boundary' not in options:
+        return
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+    name, filename, data = None, None, bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("Client disconnected during upload")
+        more_body = message.get("more_body", False)
+        decoder.receive_data(message.get("body", b""))
+        if not more_body:
+            decoder.receive_data(None)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, File):
+                name, filename, data = event.name, event.filename, bytearray()
+            elif isinstance(event, Data) and name == field and filename is not None:
+                data += event.data
+                if not event.more_data:
+                    yield filename, bytes(data)
+                    name, filename, data = None, None, bytearray()
+            event = decoder.next_event()
+
+
+async def decode_audio(audio_bytes, filename, deadline):
+    if is_wav(audio_bytes):
+        deadline.check(f"decoding {filename}")
+        return await stages["decode"].run(decode_upload, audio_bytes, filename, voice.TARGET_SR)
+    return await asyncio.wrap_future(voice.decoder_pool.submit(audio_bytes, filename, target_sr=voice.TARGET_SR, deadline=deadline))
+
+
+async def classify_upload(filename, audio_bytes, deadline):
+    """Label for one upload, or None if it could not be processed (the Flask app skips those too)."""
+    try:
+        # Resubmitted recordings are answered from the prediction cache without decoding
+        cache_key = await stages["io"].run(voice.prediction_cache.key, audio_bytes)
+        cached_label = voice.prediction_cache.get(cache_key)
+        if cached_label is not None:
+            print(f"[classify_upload] : Cache hit for {filename}")
+            return cached_label
+
+        estimate = estimate_audio_seconds(audio_bytes)
+        timeout = min(voice.admission.max_wait_seconds, deadline.remaining())
+        with await voice.admission.admit_async(estimate, timeout=timeout) as ticket:
+            audio_data, sr = await decode_audio(audio_bytes, filename, deadline)
+            print(f"[classify_upload] : Decoded {filename} with sample rate {sr}")
+            ticket.correct(estimate, len(audio_data) / sr)
+            custom_features = await stages["dsp"].run(voice.extract_custom_features, audio_data, deadline)
+            prediction = await asyncio.wrap_future(voice.inference_queue.submit(custom_features, deadline))
+        predicted_label = LABELS[int(prediction[0] > 0.5)]
+        print(f"[classify_upload] : Prediction made for {filename}: {prediction}")
+        voice.prediction_cache.put(cache_key, predicted_label)
+        return predicted_label
+    except (Overloaded, DeadlineExceeded):
+        raise  # ends the whole request, see process_audio
+    except Exception as e:
+        print(f"[classify_upload] : Error processing file {filename}: {e}")
+        traceback.print_exc()
+        return None
+
+
+def _cancel(tasks):
+    for _, task in tasks:
+        task.cancel()
+
+
+async def watch_disconnect(receive, deadline, tasks):
+    # The body has been read, so the only message left to come is the client going away
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    deadline.cancel()
+    _cancel(tasks)
+
+
+async def process_audio(scope, receive, send):
+    print("[process_audio] : Processing audio files")
+    # The stages drop this request's work once the deadline passes or the client disconnects
+    deadline = Deadline.from_header(dict(scope["headers"]).get(b"x-request-timeout"))
+    tasks = []
+    try:
+        async for filename, audio_bytes in read_uploads(scope, receive):
+            if not voice.allowed_file(filename):
+                error_msg = f"[process_audio] : File type {filename} is not allowed. Supported types are {voice.SUPPORTED_EXTENSIONS}"
+                print(error_msg)
+                _cancel(tasks)
+                await send_json(send, {"error": error_msg}, 400)
+                return
+            tasks.append((filename, asyncio.create_task(classify_upload(filename, audio_bytes, deadline))))
+    except ConnectionError as e:
+        # Drop the work already queued for this request; there is no one left to answer
+        print(f"[process_audio] : {e}")
+        _cancel(tasks)
+        return
+
+    if not tasks:
+        print("[process_audio] : No files found in the request")
+        await send_json(send, {"error": "No files found in the request"}, 400)
+        return
+
+    watcher = asyncio.create_task(watch_disconnect(receive, deadline, tasks))
+    try:
+        labels = await asyncio.gather(*(task for _, task in tasks))
+    except Overloaded as e:
+        print(f"[process_audio] : Turned away with {e.status}: {e}")
+        _cancel(tasks)
+        await send_json(send, {"error": str(e), "retry_after": e.retry_after}, e.status,
+                        headers=[(b"retry-after", str(e.retry_after).encode())])
+        return
+    except DeadlineExceeded as e:
+        print(f"[process_audio] : Gave up: {e}")
+        _cancel(tasks)
+        await send_json(send, {"error": str(e)}, 504)
+        return
+    except asyncio.CancelledError:
+        if not deadline.cancelled:
+            raise
+        print("[process_audio] : Client disconnected; dropped the rest of its work")
+        return
+    finally:
+        watcher.cancel()
+    audios = [{"filename": filename, "prediction": label} for (filename, _), label in zip(tasks, labels) if label is not None]
+    await stages["io"].run(voice.save_results, audios)
+    await send_json(send, {"message": "Features extracted and classified successfully", "audios": audios})
+
+
+def _query_arg(query, name, type=str, default=None):
+    # Same leniency as Flask's request.args.get(name, default, type): a bad value falls back to the default
+    try:
+        return type(query[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+async def get_audio_results(scope, receive, send):
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        filters = {
+            "filename": _query_arg(query, 'filename'),
+            "label": _query_arg(query, 'label'),
+            "since": _query_arg(query, 'since', float),
+            "until": _query_arg(query, 'until', float),
+        }
+        limit = _query_arg(query, 'limit', int, 100)
+        offset = _query_arg(query, 'offset', int, 0)
+        descending = _query_arg(query, 'order', default='asc').lower() == 'desc'
+
+        def read_page():
+            total = voice.result_store.count(**filters)
+            if total == 0:
+                return total, []
+            return total, voice.result_store.query(limit=limit, offset=offset, descending=descending, **filters)
+
+        total, audios = await stages["io"].run(read_page)
+        if total == 0:
+            print(f"[get_audio_results] : No results found in {voice.result_store.db_path}")
+            await send_json(send, {"message": "No results found"}, 404)
+            return
+        print(f"[get_audio_results] : Successfully retrieved {len(audios)} of {total} results")
+        await send_json(send, audios, headers=[
+            (b"x-total-count", str(total).encode()),
+            (b"x-offset", str(offset).encode()),
+            (b"x-limit", str(limit).encode()),
+        ])
+    except Exception as e:
+        print(f"[get_audio_results] : Error retrieving results: {e}")
+        traceback.print_exc()
+        await send_json(send, {"error": "Error retrieving results"}, 500)
+
+
+async def get_stage_stats(scope, receive, send):
+    await send_json(send, {name: stage.stats() for name, stage in stages.items()})
+
+
+async def get_admission_stats(scope, receive, send):
+    await send_json(send, voice.admission.stats())
+
+
+routes = {
+    ('POST', '/process_audio'): process_audio,
+    ('GET', '/audio_results'): get_audio_results,
+    ('GET', '/stage_stats'): get_stage_stats,
+    ('GET', '/admission_stats'): get_admission_stats,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for stage in stages.values():
+                stage.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if scope["method"] == 'OPTIONS':
+        # CORS preflight, matching init_cors on the Flask app
+        await send({"type": "http.response.start", "status": 204, "headers": [
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+            (b"access-control-allow-headers", dict(scope["headers"]).get(b"access-control-request-headers", b"*")),
+        ]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    handler = routes.get((scope["method"], scope["path"]))
+    if handler is None:
+        await send_json(send, {"error": f"No route for {scope['method']} {scope['path']}"}, 404)
+        return
+    await handler(scope, receive, send)
+
+
+if __name__ == '__main__':
+    if uvicorn is None:
+        print("[main] : uvicorn is not installed; serve voice_asgi:app with any ASGI server")
+    else:
+        print("[main] : Starting ASGI server...")
+        # One process: the pools above are per process, and the executors give the concurrency
+        uvicorn.run(app, host='0.0.0.0', port=PORT)
@@ -0,0 +1,60 @@
+#worker_process.py
+#
+# Long-lived worker processes for the decoder and feature pools. Every worker is a fresh
+# interpreter, as with multiprocessing's spawn start method, that imports only the module
+# its loop is defined in and talks to the server over a multiprocessing Connection on a
+# socket pair. Nothing is forked from the server, so a worker started or restarted after
+# TensorFlow is loaded inherits none of its threads or locks. The spawn and forkserver
+# contexts would re-run the launching script in each worker (voice.py builds its model at
+# import); a worker started here never does.
+import os
+import socket
+import subprocess
+import sys
+from multiprocessing.connection import Connection
+
+# Global Variables
+LAUNCH = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from multiprocessing.connection import Connection
+module = __import__(sys.argv[2])
+getattr(module, sys.argv[3])(Connection(int(sys.argv[4])))
+"""
+
+
+class WorkerProcess:
+    """Runs function(conn) from a module-level function in a new interpreter; conn is the server's end."""
+
+    def __init__(self, function):
+        module = sys.modules[function.__module__]
+        module_dir = os.path.dirname(os.path.abspath(module.__file__))
+        parent_sock, child_sock = socket.socketpair()
+        self.conn = Connection(parent_sock.detach())
+        child_fd = child_sock.detach()
+        try:
+            self._process = subprocess.Popen(
+                [sys.executable, '-c', LAUNCH, module_dir, module.__name__, function.__name__, str(child_fd)],
+                pass_fds=(child_fd,))
+        except BaseException:
+            self.conn.close()
+            raise
+        finally:
+            os.close(child_fd)
+        self.pid = self._process.pid
+
+    @property
+    def exitcode(self):
+        return self._process.poll()
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def kill(self):
+        self._process.kill()
+
+    def join(self, timeout=None):
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass